@@ -1,12 +1,29 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Header, HTTPException, Query, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import json
-from datetime import datetime
+import asyncio
+import math
+import os
+import uuid
+from datetime import datetime, timedelta
 
+from app.db.partitions import is_valid_tenant_id
 from app.db.session import get_db
+from app.models.task import DEFAULT_TENANT
+from app.services.archive import archive_completed_tasks
+from app.services.connections import ConnectionManager
+from app.services.dedupe import DUPLICATE_POLICIES
+from app.services.outbox import OutboxRelay, replay_events
 from app.services.tasks import TaskService
-from app.services.gemini_agent import task_agent
+from app.services.write_coalescer import WriteCoalescer
+from app.services.task_transfer import EXPORT_FORMATS, export_tasks, import_tasks
+from app.utils.serialization import dumps_bytes
+from app.services.gemini_agent import get_task_agent
+from app.services.rate_limit import RateLimitExceeded, chat_limiter, write_limiter
+from app.utils.config import settings
 from app.schemas.task import (
     TaskCreate, TaskUpdate, TaskResponse, TaskFilter,
     ChatMessage, ChatResponse
@@ -15,31 +32,55 @@ from app.schemas.task import (
 router = APIRouter()
 
 # WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+manager = ConnectionManager(
+    heartbeat_interval=settings.WS_HEARTBEAT_INTERVAL_SECONDS,
+    heartbeat_timeout=settings.WS_HEARTBEAT_TIMEOUT_SECONDS,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    max_buffered_bytes=settings.WS_MAX_BUFFERED_BYTES
+)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Task events reach clients only through the outbox: TaskService records
+# them in the same transaction as each write and this relay delivers them
+outbox_relay = OutboxRelay(
+    deliver=manager.broadcast,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL_MS / 1000,
+    gap_timeout=settings.OUTBOX_GAP_TIMEOUT_SECONDS,
+    retention=timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+)
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+# Used by PUT /tasks/{task_id} when WRITE_COALESCE_ENABLED is set
+write_coalescer = WriteCoalescer(window=settings.WRITE_COALESCE_WINDOW_MS / 1000)
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+def get_tenant_id(x_tenant_id: Optional[str] = Header(None)) -> str:
+    """Dependency that resolves the tenant from the X-Tenant-ID header"""
+    if x_tenant_id is None:
+        return DEFAULT_TENANT
+    if not is_valid_tenant_id(x_tenant_id):
+        raise HTTPException(status_code=400, detail="Invalid X-Tenant-ID header")
+    return x_tenant_id
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove broken connections
-                if connection in self.active_connections:
-                    self.active_connections.remove(connection)
+def _rate_limited(e: RateLimitExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    )
 
-manager = ConnectionManager()
+def limit_writes(request: Request):
+    """Dependency that applies the task write rate limit"""
+    try:
+        write_limiter.check(request.client.host if request.client else "unknown")
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
+
+def limit_chat(request: Request):
+    """Dependency that applies the chat rate limit"""
+    try:
+        chat_limiter.check(request.client.host if request.client else "unknown")
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
 
 # REST API Routes
 @router.get("/tasks", response_model=List[TaskResponse])
@@ -48,96 +89,255 @@ async def get_tasks(
     priority: Optional[str] = None,
     category: Optional[str] = None,
     search: Optional[str] = None,
+    semantic: Optional[str] = None,
+    include_archived: bool = False,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
 ):
     """Get all tasks with optional filtering"""
-    task_service = TaskService(db)
+    task_service = TaskService(db, tenant_id=tenant_id)
     filters = TaskFilter(
         completed=completed,
         priority=priority,
         category=category,
-        search=search
+        search=search,
+        include_archived=include_archived,
+        due_after=due_after,
+        due_before=due_before
     )
-    tasks = task_service.get_tasks(filters=filters, skip=skip, limit=limit)
-    return [TaskResponse.model_validate(task) for task in tasks]
-
-@router.post("/tasks", response_model=TaskResponse)
-async def create_task(task: TaskCreate, db: Session = Depends(get_db)):
-    """Create a new task"""
-    task_service = TaskService(db)
-    db_task = task_service.create_task(task)
+    if semantic:
+        # Ranked by meaning rather than substring; archived tasks are not searched
+        tasks = task_service.semantic_search(semantic, filters=filters, skip=skip, limit=limit)
+        return Response(content=dumps_bytes([task.to_dict() for task in tasks]), media_type="application/json")
+    if due_after is not None or due_before is not None:
+        # Calendar view: repeating tasks are expanded into their occurrences
+        tasks = task_service.get_tasks(filters=filters, skip=skip, limit=limit)
+        return Response(content=dumps_bytes([task.to_dict() for task in tasks]), media_type="application/json")
+    
+    # Rows come straight from the database in TaskResponse shape, so they are
+    # serialized directly instead of being validated per row twice over.
+    # Returning a Response also skips FastAPI's response_model validation.
+    rows = task_service.get_task_rows(filters=filters, skip=skip, limit=limit)
+    return Response(content=dumps_bytes(rows), media_type="application/json")
+
+@router.post("/tasks", response_model=TaskResponse, dependencies=[Depends(limit_writes)])
+async def create_task(
+    task: TaskCreate,
+    response: Response,
+    on_duplicate: Optional[str] = None,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Create a new task, or merge it into a near-duplicate open task"""
+    if on_duplicate is not None and on_duplicate not in DUPLICATE_POLICIES:
+        raise HTTPException(status_code=400, detail=f"Unsupported duplicate policy: {on_duplicate}")
     
-    # Broadcast update to all WebSocket connections
-    await manager.broadcast(json.dumps({
-        "type": "task_created",
-        "task": db_task.to_dict()
-    }))
+    task_service = TaskService(db, tenant_id=tenant_id)
+    db_task, duplicate = task_service.create_or_merge_task(task, on_duplicate)
+    if duplicate is not None:
+        response.headers["X-Duplicate-Of"] = str(duplicate.id)
     
     return TaskResponse.model_validate(db_task)
 
+@router.get("/tasks/export")
+def export_all_tasks(
+    format: str = "ndjson",
+    completed: Optional[bool] = None,
+    priority: Optional[str] = None,
+    category: Optional[str] = None,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Stream all tasks as NDJSON or CSV"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    
+    task_service = TaskService(db, tenant_id=tenant_id)
+    filters = TaskFilter(completed=completed, priority=priority, category=category)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_tasks(task_service, fmt=format, filters=filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'}
+    )
+
+@router.post("/tasks/import", dependencies=[Depends(limit_writes)])
+async def import_all_tasks(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Import tasks from an uploaded NDJSON or CSV file"""
+    if format is None:
+        format = "csv" if (file.filename or "").lower().endswith(".csv") else "ndjson"
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format: {format}")
+    
+    task_service = TaskService(db, tenant_id=tenant_id)
+    # Parsing and inserting are blocking; keep them off the event loop
+    return await run_in_threadpool(import_tasks, task_service, file.file, format)
+
+@router.post("/tasks/dedupe", dependencies=[Depends(limit_writes)])
+async def dedupe_tasks(dry_run: bool = True, db: Session = Depends(get_db), tenant_id: str = Depends(get_tenant_id)):
+    """Find near-duplicate open tasks and, unless dry_run, merge each group into its oldest task"""
+    task_service = TaskService(db, tenant_id=tenant_id)
+    return await run_in_threadpool(task_service.dedupe_tasks, dry_run)
+
+@router.post("/tasks/archive", dependencies=[Depends(limit_writes)])
+async def archive_tasks(
+    older_than_days: int = Query(settings.ARCHIVE_AFTER_DAYS, ge=1),
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Archive this tenant's tasks completed more than `older_than_days` ago"""
+    archived = await run_in_threadpool(
+        archive_completed_tasks, db, older_than_days, settings.ARCHIVE_BATCH_SIZE, tenant_id
+    )
+    return {"archived": archived}
+
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
-async def get_task(task_id: int, db: Session = Depends(get_db)):
+async def get_task(
+    task_id: int,
+    include_archived: bool = False,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
     """Get a specific task"""
-    task_service = TaskService(db)
-    task = task_service.get_task(task_id)
+    task_service = TaskService(db, tenant_id=tenant_id)
+    task = task_service.get_task(task_id, include_archived=include_archived)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return TaskResponse.model_validate(task)
 
-@router.put("/tasks/{task_id}", response_model=TaskResponse)
-async def update_task(task_id: int, task: TaskUpdate, db: Session = Depends(get_db)):
+@router.post("/tasks/{task_id}/restore", response_model=TaskResponse, dependencies=[Depends(limit_writes)])
+async def restore_task(task_id: int, db: Session = Depends(get_db), tenant_id: str = Depends(get_tenant_id)):
+    """Move an archived task back into the active task list"""
+    task_service = TaskService(db, tenant_id=tenant_id)
+    db_task = task_service.restore_task(task_id)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Archived task not found")
+    
+    return TaskResponse.model_validate(db_task)
+
+@router.put("/tasks/{task_id}", response_model=TaskResponse, dependencies=[Depends(limit_writes)])
+async def update_task(
+    task_id: int,
+    task: TaskUpdate,
+    flush: bool = False,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
     """Update a task"""
-    task_service = TaskService(db)
+    if settings.WRITE_COALESCE_ENABLED:
+        return await _coalesced_update(task_id, task, flush, db, tenant_id)
+    
+    task_service = TaskService(db, tenant_id=tenant_id)
     db_task = task_service.update_task(task_id, task)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    # Broadcast update to all WebSocket connections
-    await manager.broadcast(json.dumps({
-        "type": "task_updated",
-        "task": db_task.to_dict()
-    }))
+    return TaskResponse.model_validate(db_task)
+
+@router.put("/tasks/{task_id}/occurrences/{occurrence_date}", response_model=TaskResponse, dependencies=[Depends(limit_writes)])
+async def update_occurrence(
+    task_id: int,
+    occurrence_date: datetime,
+    task: TaskUpdate,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Complete or edit one occurrence of a repeating task, storing it as a task of its own"""
+    task_service = TaskService(db, tenant_id=tenant_id)
+    try:
+        db_task = task_service.update_occurrence(task_id, occurrence_date, task)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Repeating task not found")
+    
+    return TaskResponse.model_validate(db_task)
+
+async def _coalesced_update(task_id: int, task: TaskUpdate, flush: bool, db: Session, tenant_id: str):
+    """
+    Merge the update with others for the same task arriving within the
+    coalescing window. `flush=true` commits everything buffered for the task
+    right away, for clients that need the write to be durable on return.
+    """
+    fields = task.model_dump(exclude_unset=True)
+    if not flush and settings.WRITE_COALESCE_DURABILITY == "async":
+        db_task = await run_in_threadpool(TaskService(db, tenant_id=tenant_id).get_task, task_id)
+        if not db_task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        write_coalescer.add(tenant_id, task_id, fields)
+        # Accepted but not yet written: answer with the task as it will be
+        # once buffered fields are committed; the task_updated event follows
+        pending = write_coalescer.pending_fields(tenant_id, task_id)
+        return JSONResponse(status_code=202, content={**db_task.to_dict(), **jsonable_encoder(pending)})
+    
+    result = write_coalescer.add(tenant_id, task_id, fields)
+    if flush:
+        await write_coalescer.flush(tenant_id, task_id)
+    
+    updated = await asyncio.shield(result)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return updated
+
+@router.post("/tasks/{task_id}/flush", response_model=TaskResponse)
+async def flush_task(task_id: int, db: Session = Depends(get_db), tenant_id: str = Depends(get_tenant_id)):
+    """Commit any coalesced updates still buffered for a task and return it"""
+    updated = await write_coalescer.flush(tenant_id, task_id)
+    if updated is not None:
+        return updated
     
+    db_task = TaskService(db, tenant_id=tenant_id).get_task(task_id)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
     return TaskResponse.model_validate(db_task)
 
-@router.delete("/tasks/{task_id}")
-async def delete_task(task_id: int, db: Session = Depends(get_db)):
+@router.delete("/tasks/{task_id}", dependencies=[Depends(limit_writes)])
+async def delete_task(task_id: int, db: Session = Depends(get_db), tenant_id: str = Depends(get_tenant_id)):
     """Delete a task"""
-    task_service = TaskService(db)
+    task_service = TaskService(db, tenant_id=tenant_id)
     success = task_service.delete_task(task_id)
     if not success:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    # Broadcast update to all WebSocket connections
-    await manager.broadcast(json.dumps({
-        "type": "task_deleted",
-        "task_id": task_id
-    }))
-    
     return {"message": "Task deleted successfully"}
 
+@router.get("/events")
+async def get_events(
+    after: int = 0,
+    limit: int = 500,
+    lookback: int = 0,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id),
+):
+    """Replay task events with seq greater than `after`, e.g. after a WebSocket reconnect"""
+    return replay_events(db, tenant_id, after, min(max(limit, 1), 1000), min(max(lookback, 0), 10000))
+
 # Chat API Route
-@router.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(message: ChatMessage, db: Session = Depends(get_db)):
+@router.post("/chat", response_model=ChatResponse, dependencies=[Depends(limit_chat)])
+async def chat_with_agent(message: ChatMessage, db: Session = Depends(get_db), tenant_id: str = Depends(get_tenant_id)):
     """Process a chat message with the AI agent"""
     try:
-        # Process message with the Gemini agent
-        result = task_agent.process_message(message.message)
-        
-        # If tasks were updated, broadcast the changes
-        if result.get("tasks_updated") and result.get("task_data"):
-            await manager.broadcast(json.dumps({
-                "type": "tasks_updated",
-                "data": result["task_data"]
-            }))
+        # Process message with the Gemini agent off the event loop
+        session_id = message.session_id or uuid.uuid4().hex
+        result = await run_in_threadpool(get_task_agent().process_message, message.message, session_id, tenant_id)
         
         return ChatResponse(
             response=result["response"],
             tasks_updated=result.get("tasks_updated", False),
-            task_data=result.get("task_data")
+            task_data=result.get("task_data"),
+            session_id=session_id
         )
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
     except Exception as e:
         return ChatResponse(
             response=f"I'm sorry, I encountered an error: {str(e)}",
@@ -148,47 +348,76 @@ async def chat_with_agent(message: ChatMessage, db: Session = Depends(get_db)):
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time updates"""
-    await manager.connect(websocket)
+    # Browsers cannot set headers on WebSocket handshakes, so ?tenant= is accepted too
+    tenant_id = websocket.query_params.get("tenant") or websocket.headers.get("x-tenant-id") or DEFAULT_TENANT
+    if not is_valid_tenant_id(tenant_id):
+        await websocket.close(code=1008)
+        return
+    connection = await manager.connect(websocket, tenant_id)
+    if connection is None:
+        return
+    client_id = websocket.client.host if websocket.client else "unknown"
+    # Clients may pass ?session_id= to keep their chat context across reconnects
+    session_id = websocket.query_params.get("session_id", "")[:64] or uuid.uuid4().hex
     try:
         while True:
             # Wait for messages from client
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = await connection.receive_message()
             
             if message_data.get("type") == "chat":
-                # Process chat message
-                result = task_agent.process_message(message_data.get("message", ""))
+                connection.mark_active()
+                # Process chat message, rejecting it immediately when over the limit
+                try:
+                    chat_limiter.check(client_id)
+                    result = await run_in_threadpool(get_task_agent().process_message, message_data.get("message", ""), session_id, tenant_id)
+                except RateLimitExceeded as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "error": "rate_limited",
+                        "message": str(e),
+                        "retry_after": e.retry_after,
+                        "timestamp": datetime.utcnow().isoformat()
+                    }, connection)
+                    continue
                 
                 # Send response back to the client
-                await manager.send_personal_message(json.dumps({
+                await manager.send_personal_message({
                     "type": "chat_response",
                     "response": result["response"],
                     "tasks_updated": result.get("tasks_updated", False),
                     "task_data": result.get("task_data"),
                     "timestamp": datetime.utcnow().isoformat()
-                }), websocket)
-                
-                # If a task was created, broadcast the new task creation
-                if result.get("tasks_updated") and result.get("task_data"):
-                    # Send individual task created event
-                    await manager.broadcast(json.dumps({
-                        "type": "task_created",
-                        "task": result["task_data"],
-                        "timestamp": datetime.utcnow().isoformat()
-                    }))
+                }, connection)
             
             elif message_data.get("type") == "ping":
                 # Respond to ping for connection health check
-                await manager.send_personal_message(json.dumps({
+                await manager.send_personal_message({
                     "type": "pong",
                     "timestamp": datetime.utcnow().isoformat()
-                }), websocket)
+                }, connection)
+            
+            # "pong" replies to server heartbeats need no answer; receiving
+            # any message is what keeps the connection from being reaped
                 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        manager.disconnect(connection)
     except Exception as e:
         print(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
+        manager.disconnect(connection)
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Connection and queue metrics of the worker that serves the request.
+    Each worker tracks only its own clients, so aggregate across workers.
+    """
+    return {
+        "worker_pid": os.getpid(),
+        "websocket": manager.stats(),
+        "outbox": outbox_relay.stats(),
+        "write_coalescer": {"pending": write_coalescer.pending_count()},
+        "timestamp": datetime.utcnow().isoformat()
+    }
 
 # Health check endpoint
 @router.get("/health")
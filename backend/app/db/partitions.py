@@ -0,0 +1,67 @@
+import hashlib
+import re
+import threading
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from app.db.session import engine
+from app.models.task import DEFAULT_TENANT, PARTITIONED
+
+# Tenant IDs are used in partition DDL, so they are restricted to a safe alphabet
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# How long partition DDL waits for locks on tasks before giving up
+PARTITION_LOCK_TIMEOUT = "2s"
+
+_known_partitions = set()
+_lock = threading.Lock()
+
+def is_valid_tenant_id(tenant_id: str) -> bool:
+    return bool(TENANT_ID_PATTERN.match(tenant_id or ""))
+
+def partition_name(tenant_id: str) -> str:
+    """Stable, identifier-safe table name for a tenant's partition"""
+    return "tasks_t_" + hashlib.sha1(tenant_id.encode("utf-8")).hexdigest()[:16]
+
+def create_default_partitions(connection):
+    """Create the catch-all and default-tenant partitions (PostgreSQL only)"""
+    if not PARTITIONED:
+        return
+    connection.execute(text("CREATE TABLE IF NOT EXISTS tasks_default PARTITION OF tasks DEFAULT"))
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(DEFAULT_TENANT)} "
+        f"PARTITION OF tasks FOR VALUES IN ('{DEFAULT_TENANT}')"
+    ))
+
+def ensure_tenant_partition(tenant_id: str):
+    """
+    Give a tenant its own partition before its first write in this process.
+    
+    The DDL runs and commits on a connection of its own, so the caller's
+    transaction never holds it and a rollback can't undo a partition that
+    was already recorded as created. The tenant is only recorded once the
+    partition commits; on any error the next write tries again.
+    
+    If the tenant already has rows in the catch-all partition, Postgres
+    refuses to create the partition; those rows keep living in
+    tasks_default, which is still correct, just not split out. The lock
+    timeout covers the caller's own open transaction holding a lock the DDL
+    needs: it gives up rather than waiting on itself.
+    """
+    if not PARTITIONED or tenant_id in _known_partitions:
+        return
+    if not is_valid_tenant_id(tenant_id):
+        raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+    
+    with _lock:
+        if tenant_id in _known_partitions:
+            return
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(tenant_id)} "
+                    f"PARTITION OF tasks FOR VALUES IN ('{tenant_id}')"
+                ))
+        except DBAPIError:
+            return
+        _known_partitions.add(tenant_id)
@@ -1,30 +1,160 @@
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.utils.config import settings
 
 # Create database engine
 engine = create_engine(settings.DATABASE_URL)
 
+class ReplicaPool:
+    """
+    Round-robin over read replica engines with simple health tracking.
+
+    A replica that fails a query or a health check is skipped for
+    REPLICA_HEALTH_CHECK_INTERVAL seconds, then probed with SELECT 1
+    before it is used again.
+    """
+    def __init__(self, engines, check_interval: float):
+        self.engines = engines
+        self.check_interval = check_interval
+        self._retry_at = {}
+        self._cycle = itertools.cycle(engines)
+        self._lock = threading.Lock()
+        for replica in engines:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def choose(self):
+        """Return the next healthy replica, or None to fall back to the primary"""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                replica = next(self._cycle)
+                retry_at = self._retry_at.get(replica)
+            if retry_at is None:
+                return replica
+            if time.monotonic() >= retry_at and self._check(replica):
+                return replica
+        return None
+
+    def mark_unhealthy(self, replica):
+        with self._lock:
+            self._retry_at[replica] = time.monotonic() + self.check_interval
+
+    def _check(self, replica) -> bool:
+        try:
+            with replica.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception:
+            self.mark_unhealthy(replica)
+            return False
+        with self._lock:
+            self._retry_at.pop(replica, None)
+        return True
+
+    def _on_error(self, context):
+        if context.is_disconnect or context.connection is None:
+            self.mark_unhealthy(context.engine)
+
+replica_pool = (
+    ReplicaPool(
+        [create_engine(url, pool_pre_ping=True) for url in settings.DATABASE_REPLICA_URLS],
+        settings.REPLICA_HEALTH_CHECK_INTERVAL
+    )
+    if settings.DATABASE_REPLICA_URLS else None
+)
+
+class RoutingSession(Session):
+    """
+    Session that sends read-only work to a replica.
+
+    Reads go to a replica only while session.info["read_only"] is set (see
+    TaskService). As soon as the session writes it is pinned to the primary
+    for the rest of its life, so it always reads its own writes. Later
+    requests from the same client are pinned by the cookie set in
+    pin_to_primary().
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if clause is not None and getattr(clause, "is_dml", False):
+            self.info["use_primary"] = True
+        elif (
+            replica_pool is not None
+            and self.info.get("read_only")
+            and not self.info.get("use_primary")
+            and not self._flushing
+        ):
+            replica = replica_pool.choose()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+@event.listens_for(RoutingSession, "after_flush")
+def _pin_to_primary(session, flush_context):
+    session.info["use_primary"] = True
+
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
 
 # Create Base class
 Base = declarative_base()
 
-def get_db():
+# Cookie holding the time (epoch seconds) until which a client that wrote
+# keeps reading from the primary
+PRIMARY_PIN_COOKIE = "primary_until"
+
+def pin_to_primary(response: Response):
+    """Keep the client's reads on the primary for READ_YOUR_WRITES_SECONDS"""
+    if replica_pool is None or settings.READ_YOUR_WRITES_SECONDS <= 0:
+        return
+    response.set_cookie(
+        PRIMARY_PIN_COOKIE,
+        str(time.time() + settings.READ_YOUR_WRITES_SECONDS),
+        max_age=max(1, int(settings.READ_YOUR_WRITES_SECONDS)),
+        httponly=True,
+        samesite="lax",
+    )
+
+def pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def get_db(request: Request):
     """
     Dependency to get database session
     """
     db = SessionLocal()
+    if pinned_to_primary(request):
+        # The client wrote recently; a replica may not have the write yet
+        db.info["use_primary"] = True
     try:
         yield db
     finally:
         db.close()
 
+# Set once this process (or the gunicorn master it was forked from) has
+# created the tables, so workers don't all race to do it again
+tables_created = False
+
+# pg_advisory_xact_lock key serializing create_tables across processes
+CREATE_TABLES_LOCK = 0x7461736b
+
 def create_tables():
     """
     Create all tables in the database
     """
+    global tables_created
     from app.models.task import Base
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from app.db.partitions import create_default_partitions
+    import app.models.conversation  # registers conversation_messages on Base
+    import app.models.task_event  # registers task_events on Base
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # Concurrent CREATE TABLEs fail on the catalog's unique indexes
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CREATE_TABLES_LOCK})
+        Base.metadata.create_all(bind=connection)
+        create_default_partitions(connection)
+    tables_created = True
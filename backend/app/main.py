@@ -1,7 +1,12 @@
-from fastapi import FastAPI
+import asyncio
+import threading
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router
-from app.db.session import create_tables
+from app.api.routes import manager, outbox_relay, router, write_coalescer
+from app.db import session as db_session
+from app.db.session import create_tables, pin_to_primary
+from app.services.archive import archive_loop
+from app.services.gemini_agent import get_task_agent
 from app.utils.config import settings
 
 # Create FastAPI app
@@ -20,13 +25,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Methods that can write; a successful response pins the client's reads
+# to the primary for a few seconds
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    if request.method in WRITE_METHODS and response.status_code < 400:
+        pin_to_primary(response)
+    return response
+
 # Include API routes
 app.include_router(router, prefix="/api/v1", tags=["tasks"])
 
 @app.on_event("startup")
 async def startup_event():
     """Create database tables on startup"""
-    create_tables()
+    # Under gunicorn the master has already created them before forking
+    if not db_session.tables_created:
+        create_tables()
+    
+    # Warm the agent off the startup path so /health is served immediately
+    if settings.AGENT_WARMUP:
+        threading.Thread(target=lambda: get_task_agent().warm_up(), daemon=True).start()
+    
+    # Deliver committed task events to this worker's WebSocket clients
+    app.state.outbox_task = asyncio.create_task(outbox_relay.run())
+    
+    # Ping quiet WebSocket clients and reap the dead ones
+    app.state.heartbeat_task = asyncio.create_task(manager.heartbeat_loop())
+    
+    # Archive old completed tasks in the background; the reference on
+    # app.state keeps the task from being garbage collected
+    if settings.ARCHIVE_ENABLED:
+        app.state.archive_task = asyncio.create_task(archive_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write out any coalesced task updates still buffered"""
+    await write_coalescer.flush_all()
+    app.state.outbox_task.cancel()
+    app.state.heartbeat_task.cancel()
 
 @app.get("/")
 async def root():
@@ -1,14 +1,23 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Identity, Index, LargeBinary
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import declared_attr, deferred
 from sqlalchemy.sql import func
 from datetime import datetime
+from app.utils.config import settings
 
 Base = declarative_base()
 
-class Task(Base):
-    __tablename__ = "tasks"
-    
-    id = Column(Integer, primary_key=True, index=True)
+DEFAULT_TENANT = "default"
+
+# On PostgreSQL the tasks table is LIST-partitioned by tenant_id. Postgres
+# requires the partition key in the primary key, so there the key is
+# (id, tenant_id) with an identity id; other databases (SQLite) get a plain
+# table keyed by id alone.
+PARTITIONED = make_url(settings.DATABASE_URL).get_backend_name() == "postgresql"
+
+class TaskFields:
+    """Columns shared by live tasks and their archived copies"""
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     completed = Column(Boolean, default=False)
@@ -17,6 +26,22 @@ class Task(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     due_date = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    @declared_attr
+    def embedding(cls):
+        # float32 vector of title + description for semantic search. Deferred,
+        # so loading tasks doesn't pull ~2 KB per row that only the semantic
+        # index reads (with its own column query)
+        return deferred(Column(LargeBinary, nullable=True))
+    
+    # Recurrence rule (see app.services.recurrence) of a repeating task; its
+    # occurrences are computed on read, starting from due_date
+    recurrence = Column(String(255), nullable=True)
+    # Set on occurrences that were completed or edited and so stored as rows
+    # of their own: the repeating task and the occurrence's original date
+    recurrence_id = Column(Integer, nullable=True)
+    occurrence_date = Column(DateTime(timezone=True), nullable=True)
     
     def to_dict(self):
         return {
@@ -29,4 +54,35 @@ class Task(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "due_date": self.due_date.isoformat() if self.due_date else None,
-        }
\ No newline at end of file
+            "recurrence": self.recurrence,
+            "recurrence_id": self.recurrence_id,
+            "occurrence_date": self.occurrence_date.isoformat() if self.occurrence_date else None,
+        }
+
+class Task(TaskFields, Base):
+    __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_tenant_created", "tenant_id", "created_at"),
+        # Lets the archiver find old completed tasks without a full scan
+        Index("ix_tasks_completed_at", "completed", "completed_at"),
+        # At most one stored row per occurrence of a repeating task
+        Index("ux_tasks_occurrence", "tenant_id", "recurrence_id", "occurrence_date", unique=True),
+        {"postgresql_partition_by": "LIST (tenant_id)"} if PARTITIONED else {},
+    )
+    
+    id = Column(Integer, *([Identity()] if PARTITIONED else []), primary_key=True, autoincrement=True, index=True)
+    tenant_id = Column(String(64), primary_key=PARTITIONED, nullable=False, default=DEFAULT_TENANT, index=True)
+
+class ArchivedTask(TaskFields, Base):
+    """
+    Cold storage for tasks completed long ago (see app.services.archive).
+    Rows keep their original id so they can be restored in place.
+    """
+    __tablename__ = "tasks_archive"
+    __table_args__ = (
+        Index("ix_tasks_archive_tenant_created", "tenant_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    tenant_id = Column(String(64), nullable=False, default=DEFAULT_TENANT, index=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
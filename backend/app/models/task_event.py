@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from app.models.task import Base
+
+class TaskEvent(Base):
+    """Outbox row written in the same transaction as the task change it describes"""
+    __tablename__ = "task_events"
+    __table_args__ = (
+        Index("ix_task_events_tenant_seq", "tenant_id", "seq"),
+        # Without AUTOINCREMENT SQLite reuses the ids of deleted rows, so
+        # seqs would restart once pruning empties the table
+        {"sqlite_autoincrement": True},
+    )
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    tenant_id = Column(String(64), nullable=False)
+    event_type = Column(String(32), nullable=False)
+    # The WebSocket message as JSON, without its seq
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class OutboxState(Base):
+    """Single row recording the highest seq pruned from task_events"""
+    __tablename__ = "outbox_state"
+
+    id = Column(Integer, primary_key=True)
+    pruned_through = Column(Integer, nullable=False, default=0)
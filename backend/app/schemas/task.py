@@ -1,6 +1,13 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, Union
 from datetime import datetime
+from app.services.recurrence import normalize_rule
+
+def _recurrence(value: Optional[str]) -> Optional[str]:
+    """Validate a recurrence rule and store it in canonical form"""
+    if value is None or not value.strip():
+        return None
+    return normalize_rule(value)
 
 class TaskBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=255)
@@ -8,6 +15,10 @@ class TaskBase(BaseModel):
     priority: str = Field(default="medium", pattern="^(low|medium|high)$")
     category: Optional[str] = None
     due_date: Optional[datetime] = None
+    # e.g. "FREQ=WEEKLY;BYDAY=MO,TH"; occurrences start at due_date
+    recurrence: Optional[str] = Field(None, max_length=255)
+    
+    _check_recurrence = field_validator("recurrence")(_recurrence)
 
 class TaskCreate(TaskBase):
     pass
@@ -19,12 +30,17 @@ class TaskUpdate(BaseModel):
     priority: Optional[str] = Field(None, pattern="^(low|medium|high)$")
     category: Optional[str] = None
     due_date: Optional[datetime] = None
+    recurrence: Optional[str] = Field(None, max_length=255)
+    
+    _check_recurrence = field_validator("recurrence")(_recurrence)
 
 class TaskResponse(TaskBase):
     id: int
     completed: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
+    recurrence_id: Optional[int] = None
+    occurrence_date: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -34,13 +50,19 @@ class TaskFilter(BaseModel):
     priority: Optional[str] = None
     category: Optional[str] = None
     search: Optional[str] = None
+    include_archived: bool = False
+    # Due-date window; when set, repeating tasks are listed as their occurrences in it
+    due_after: Optional[datetime] = None
+    due_before: Optional[datetime] = None
 
 class ChatMessage(BaseModel):
     message: str
+    session_id: Optional[str] = Field(None, max_length=64)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class ChatResponse(BaseModel):
     response: str
     tasks_updated: bool = False
-    task_data: Optional[list] = None
+    task_data: Optional[Union[dict, list]] = None
+    session_id: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
@@ -0,0 +1,103 @@
+# Moves long-completed tasks from the hot tasks table into tasks_archive
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.task import ArchivedTask, Task
+from app.services.outbox import record_event
+from app.utils.config import settings
+
+# Columns copied between tasks and tasks_archive
+ARCHIVE_COLUMNS = tuple(
+    column.name for column in ArchivedTask.__table__.columns if column.name != "archived_at"
+)
+
+
+def archive_completed_tasks(
+    db: Session,
+    older_than_days: int,
+    batch_size: int = 500,
+    tenant_id: Optional[str] = None
+) -> int:
+    """
+    Move tasks completed more than `older_than_days` ago into tasks_archive,
+    one committed batch at a time. Returns the number of tasks archived.
+
+    Tasks completed before completed_at was tracked are aged by their last
+    update instead. Batches are claimed with SKIP LOCKED on PostgreSQL, so
+    several workers can run the job at once without colliding. Repeating
+    tasks and their stored occurrences stay put: without the stored row, a
+    completed occurrence would be listed as open again.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    finished_at = func.coalesce(Task.completed_at, Task.updated_at, Task.created_at)
+    db.info["use_primary"] = True
+    total = 0
+
+    while True:
+        query = (
+            select(Task.id, Task.tenant_id)
+            .where(
+                Task.completed == True,
+                finished_at < cutoff,
+                Task.recurrence.is_(None),
+                Task.recurrence_id.is_(None)
+            )
+            .order_by(Task.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if tenant_id is not None:
+            query = query.where(Task.tenant_id == tenant_id)
+        claimed = db.execute(query).all()
+        if not claimed:
+            break
+        ids = [task_id for task_id, _ in claimed]
+
+        db.execute(
+            insert(ArchivedTask.__table__).from_select(
+                ARCHIVE_COLUMNS,
+                select(*(getattr(Task, name) for name in ARCHIVE_COLUMNS)).where(Task.id.in_(ids))
+            )
+        )
+        db.execute(
+            delete(Task).where(Task.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        archived_by_tenant = defaultdict(list)
+        for task_id, task_tenant in claimed:
+            archived_by_tenant[task_tenant].append(task_id)
+        for task_tenant, task_ids in archived_by_tenant.items():
+            record_event(db, task_tenant, "tasks_archived", task_ids=task_ids, count=len(task_ids))
+        db.commit()
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
+
+    return total
+
+
+def run_archive_job() -> int:
+    """Archive old completed tasks for every tenant using the configured policy"""
+    db = SessionLocal()
+    try:
+        return archive_completed_tasks(db, settings.ARCHIVE_AFTER_DAYS, settings.ARCHIVE_BATCH_SIZE)
+    finally:
+        db.close()
+
+
+async def archive_loop():
+    """Background task started on app startup when ARCHIVE_ENABLED is set"""
+    while True:
+        try:
+            archived = await run_in_threadpool(run_archive_job)
+            if archived:
+                print(f"Archived {archived} completed tasks")
+        except Exception as e:
+            print(f"Warning: Task archiving failed: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
@@ -0,0 +1,270 @@
+# WebSocket connection tracking with server heartbeats and idle reaping
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.models.task import DEFAULT_TENANT
+from app.utils.ws_protocol import JSON_PROTOCOL, Frame, negotiate
+
+# Close codes sent to clients the server drops
+CLOSE_GOING_AWAY = 1001      # reaped as unresponsive or idle
+CLOSE_POLICY_VIOLATION = 1008  # fell too far behind on messages
+CLOSE_TRY_AGAIN_LATER = 1013   # worker is at its connection cap
+
+
+class ClientConnection:
+    """
+    One WebSocket client. Outgoing messages go through a queue drained by a
+    writer task, so a slow or half-open socket never holds up broadcasts to
+    the others; the bytes waiting in that queue are what the connection
+    costs beyond its fixed overhead and are capped by `max_buffered_bytes`.
+    JSON frames are ASCII, so for both wire formats the frame length is the
+    byte count.
+    """
+
+    def __init__(self, websocket: WebSocket, tenant_id: str, max_buffered_bytes: int, protocol=JSON_PROTOCOL):
+        self.websocket = websocket
+        self.tenant_id = tenant_id
+        self.protocol = protocol
+        self.max_buffered_bytes = max_buffered_bytes
+        now = time.monotonic()
+        self.connected_at = now
+        # Last frame of any kind from the client, heartbeat replies included
+        self.last_seen = now
+        # Last message that wasn't a heartbeat
+        self.last_active = now
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.buffered_bytes = 0
+        self.close_code: Optional[int] = None
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._closed = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def send(self, message: Frame) -> bool:
+        """Queue a message; False if the connection is closed or too far behind"""
+        if self.closed:
+            return False
+        # A single large message is always let through an empty buffer
+        if self.buffered_bytes and self.buffered_bytes + len(message) > self.max_buffered_bytes:
+            return False
+        self.buffered_bytes += len(message)
+        self._queue.put_nowait(message)
+        return True
+
+    async def receive_message(self) -> Dict[str, Any]:
+        """Next decoded message from the client; raises WebSocketDisconnect once closed or reaped"""
+        receive = asyncio.ensure_future(self.websocket.receive())
+        closed = asyncio.ensure_future(self._closed.wait())
+        try:
+            await asyncio.wait({receive, closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+        if not receive.done():
+            receive.cancel()
+            raise WebSocketDisconnect(self.close_code or CLOSE_GOING_AWAY)
+
+        message = receive.result()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        data = message.get("text")
+        if data is None:
+            data = message.get("bytes") or b""
+        self.last_seen = time.monotonic()
+        self.bytes_received += len(data)
+        self.messages_received += 1
+        return self.protocol.decode(data)
+
+    def mark_active(self):
+        self.last_active = self.last_seen
+
+    def stop(self):
+        """Stop sending; used once the client has gone"""
+        self._closed.set()
+        self._writer.cancel()
+
+    async def close(self, code: int):
+        if self.closed:
+            return
+        self.close_code = code
+        self.stop()
+        try:
+            # A dead peer never completes the closing handshake
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=1)
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        try:
+            while True:
+                message = await self._queue.get()
+                try:
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    else:
+                        await self.websocket.send_text(message)
+                finally:
+                    self.buffered_bytes -= len(message)
+                self.bytes_sent += len(message)
+                self.messages_sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone; the receive side notices and cleans up
+            self._closed.set()
+
+
+class ConnectionManager:
+    """
+    WebSocket clients of this worker, grouped by tenant so broadcasts only
+    reach that tenant.
+
+    heartbeat_loop() pings clients that have been quiet for
+    `heartbeat_interval` seconds and reaps those that send nothing, not even
+    a pong, for `heartbeat_timeout` seconds. With `idle_timeout` set, clients
+    that send nothing but heartbeats for that long are reaped too. Each
+    worker accepts at most `max_connections`; further clients are closed
+    with 1013 so they back off and retry, possibly on another worker.
+    """
+
+    def __init__(
+        self,
+        heartbeat_interval: float = 20,
+        heartbeat_timeout: float = 60,
+        idle_timeout: float = 0,
+        max_connections: int = 1000,
+        max_buffered_bytes: int = 1 << 20,
+    ):
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.max_buffered_bytes = max_buffered_bytes
+        self.active_connections: Dict[str, List[ClientConnection]] = {}
+        self._count = 0
+        # Totals over the life of the worker
+        self.accepted = 0
+        self.rejected = 0
+        self.reaped: Dict[str, int] = {"unresponsive": 0, "idle": 0, "slow": 0}
+        self._closing: Set[asyncio.Task] = set()
+
+    def __len__(self):
+        return self._count
+
+    async def connect(self, websocket: WebSocket, tenant_id: str = DEFAULT_TENANT) -> Optional[ClientConnection]:
+        """
+        Accept the client with the wire format it asked for (JSON unless it
+        negotiated another subprotocol), or close it with 1013 and return None
+        when at the cap
+        """
+        subprotocol, protocol = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        if self._count >= self.max_connections:
+            self.rejected += 1
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+            return None
+        connection = ClientConnection(websocket, tenant_id, self.max_buffered_bytes, protocol)
+        self.active_connections.setdefault(tenant_id, []).append(connection)
+        self._count += 1
+        self.accepted += 1
+        return connection
+
+    def disconnect(self, connection: ClientConnection):
+        self._remove(connection)
+        connection.stop()
+
+    def _remove(self, connection: ClientConnection):
+        connections = self.active_connections.get(connection.tenant_id, [])
+        if connection in connections:
+            connections.remove(connection)
+            self._count -= 1
+        if not connections:
+            self.active_connections.pop(connection.tenant_id, None)
+
+    async def send_personal_message(self, message: Dict[str, Any], connection: ClientConnection):
+        if not connection.send(connection.protocol.encode(message)):
+            self._reap(connection, "slow", CLOSE_POLICY_VIOLATION)
+
+    async def broadcast(self, message: str, tenant_id: str = DEFAULT_TENANT):
+        """Send a JSON message to the tenant's clients, encoded once per wire format"""
+        frames: Dict[str, Frame] = {}
+        for connection in list(self.active_connections.get(tenant_id, [])):
+            if connection.closed:
+                self.disconnect(connection)
+                continue
+            frame = frames.get(connection.protocol.name)
+            if frame is None:
+                frame = frames[connection.protocol.name] = connection.protocol.encode_json(message)
+            if not connection.send(frame):
+                # The client stopped reading; it catches up via /events on reconnect
+                self._reap(connection, "slow", CLOSE_POLICY_VIOLATION)
+
+    def _reap(self, connection: ClientConnection, reason: str, code: int = CLOSE_GOING_AWAY):
+        if connection.closed:
+            self.disconnect(connection)
+            return
+        self._remove(connection)
+        self.reaped[reason] += 1
+        task = asyncio.create_task(connection.close(code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def check_connections(self):
+        """Reap dead and idle clients and ping the quiet ones"""
+        now = time.monotonic()
+        ping = {"type": "ping", "timestamp": datetime.utcnow().isoformat()}
+        frames: Dict[str, Frame] = {}
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                if connection.closed:
+                    self.disconnect(connection)
+                elif now - connection.last_seen > self.heartbeat_timeout:
+                    self._reap(connection, "unresponsive")
+                elif self.idle_timeout and now - connection.last_active > self.idle_timeout:
+                    self._reap(connection, "idle")
+                elif now - connection.last_seen >= self.heartbeat_interval:
+                    frame = frames.get(connection.protocol.name)
+                    if frame is None:
+                        frame = frames[connection.protocol.name] = connection.protocol.encode(ping)
+                    if not connection.send(frame):
+                        self._reap(connection, "slow", CLOSE_POLICY_VIOLATION)
+
+    async def heartbeat_loop(self):
+        """Check connections every few seconds until cancelled"""
+        # Checking more often than the interval keeps reaping close to the timeout
+        period = max(1.0, min(self.heartbeat_interval, self.heartbeat_timeout) / 2)
+        while True:
+            await asyncio.sleep(period)
+            try:
+                self.check_connections()
+            except Exception as e:
+                print(f"Warning: WebSocket heartbeat check failed: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        """Live connection counts and memory use of this worker"""
+        connections = [c for group in self.active_connections.values() for c in group]
+        protocols: Dict[str, int] = {}
+        for connection in connections:
+            protocols[connection.protocol.name] = protocols.get(connection.protocol.name, 0) + 1
+        return {
+            "connections": len(connections),
+            "tenants": len(self.active_connections),
+            "protocols": protocols,
+            "max_connections": self.max_connections,
+            "accepted_total": self.accepted,
+            "rejected_total": self.rejected,
+            "reaped_total": dict(self.reaped),
+            "buffered_bytes": sum(c.buffered_bytes for c in connections),
+            "largest_buffer_bytes": max((c.buffered_bytes for c in connections), default=0),
+            "bytes_sent": sum(c.bytes_sent for c in connections),
+            "bytes_received": sum(c.bytes_received for c in connections),
+        }
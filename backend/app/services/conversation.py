@@ -0,0 +1,150 @@
+# Bounded per-session conversation memory for the chat agent
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, List, Tuple
+
+from app.db.session import SessionLocal
+from app.models.conversation import ConversationMessage
+from app.utils.config import settings
+
+# Number of recently mentioned task IDs remembered per session
+RECENT_TASKS_LIMIT = 10
+
+# Width of conversation_messages.session_id
+SESSION_KEY_LENGTH = 64
+
+
+def storage_key(session_id: str) -> str:
+    """
+    The session's key in conversation_messages. Tenant-scoped ids can be
+    longer than the column, so those are stored as their SHA-256 digest
+    (which, unlike them, never contains the tenant separator ":").
+    """
+    if len(session_id) <= SESSION_KEY_LENGTH:
+        return session_id
+    return hashlib.sha256(session_id.encode()).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budget trimming"""
+    return len(text) // 4 + 1
+
+
+class Conversation:
+    """Recent turns of one chat session plus the task IDs it referred to"""
+
+    __slots__ = ("turns", "tokens", "recent_task_ids", "last_listing")
+
+    def __init__(self):
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.tokens = 0
+        self.recent_task_ids: Deque[int] = deque(maxlen=RECENT_TASKS_LIMIT)
+        # Task IDs of the most recent list shown, in the order shown
+        self.last_listing: List[int] = []
+
+    def add(self, role: str, content: str, max_tokens: int):
+        cost = estimate_tokens(content)
+        self.turns.append((role, content, cost))
+        self.tokens += cost
+        # Drop the oldest turns once over budget, but always keep the latest one
+        while self.tokens > max_tokens and len(self.turns) > 1:
+            _, _, dropped = self.turns.popleft()
+            self.tokens -= dropped
+
+
+class ConversationStore:
+    """
+    In-memory LRU of conversations keyed by session ID.
+
+    At most `max_sessions` conversations are kept and each is trimmed to
+    `max_tokens` of history. When `persist` is enabled, turns are also
+    written to the conversation_messages table and reloaded on a cache miss,
+    so a session survives eviction and restarts.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_tokens: int = 2000, persist: bool = False):
+        self.max_sessions = max_sessions
+        self.max_tokens = max_tokens
+        self.persist = persist
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> Conversation:
+        conversation = self._sessions.get(session_id)
+        if conversation is not None:
+            self._sessions.move_to_end(session_id)
+            return conversation
+
+        conversation = Conversation()
+        if self.persist:
+            for role, content in self._load(session_id):
+                conversation.add(role, content, self.max_tokens)
+        self._sessions[session_id] = conversation
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return conversation
+
+    def history(self, session_id: str) -> List[Tuple[str, str]]:
+        """Return the retained (role, content) turns, oldest first"""
+        with self._lock:
+            return [(role, content) for role, content, _ in self._get(session_id).turns]
+
+    def add_turn(self, session_id: str, role: str, content: str):
+        with self._lock:
+            self._get(session_id).add(role, content, self.max_tokens)
+        if self.persist:
+            self._save(session_id, role, content)
+
+    def remember_tasks(self, session_id: str, task_ids: List[int]):
+        """Record task IDs the session just saw; the most recent ends up last"""
+        with self._lock:
+            recent = self._get(session_id).recent_task_ids
+            for task_id in task_ids:
+                if task_id in recent:
+                    recent.remove(task_id)
+                recent.append(task_id)
+
+    def remember_listing(self, session_id: str, task_ids: List[int]):
+        """Record a list of tasks as shown, so "the first one" or "the last one" can refer to it"""
+        with self._lock:
+            self._get(session_id).last_listing = list(task_ids)
+        # Listings are remembered in reverse, so the first task shown is the most recent
+        self.remember_tasks(session_id, list(reversed(task_ids)))
+
+    def last_listing(self, session_id: str) -> List[int]:
+        with self._lock:
+            return list(self._get(session_id).last_listing)
+
+    def recent_task_ids(self, session_id: str) -> List[int]:
+        with self._lock:
+            return list(self._get(session_id).recent_task_ids)
+
+    def _load(self, session_id: str) -> List[Tuple[str, str]]:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(ConversationMessage.role, ConversationMessage.content)
+                .filter(ConversationMessage.session_id == storage_key(session_id))
+                .order_by(ConversationMessage.id.desc())
+                .limit(50)
+                .all()
+            )
+            return [(row.role, row.content) for row in reversed(rows)]
+        finally:
+            db.close()
+
+    def _save(self, session_id: str, role: str, content: str):
+        db = SessionLocal()
+        try:
+            db.add(ConversationMessage(session_id=storage_key(session_id), role=role, content=content))
+            db.commit()
+        finally:
+            db.close()
+
+
+conversation_store = ConversationStore(
+    max_sessions=settings.CONVERSATION_MAX_SESSIONS,
+    max_tokens=settings.CONVERSATION_MAX_TOKENS,
+    persist=settings.CONVERSATION_PERSIST,
+)
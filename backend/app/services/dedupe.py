@@ -0,0 +1,221 @@
+# Near-duplicate task detection with MinHash signatures and LSH banding
+import re
+import threading
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.task import Task
+
+# 96 permutations in 16 bands of 6 rows: a pair at the default 0.8 threshold
+# shares a band >99% of the time, while pairs below ~0.6 rarely do, which
+# keeps buckets small even for templated titles. Candidates are always
+# verified exactly.
+NUM_PERM = 96
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# MinHash estimates are within about 0.05 of the true similarity, so
+# candidates estimated this far below the threshold are not worth verifying
+ESTIMATE_SLACK = 0.15
+
+DUPLICATE_POLICIES = ("allow", "warn", "merge")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase and strip punctuation so "Buy milk!" and "buy  milk" compare equal"""
+    return " ".join(re.findall(r"[a-z0-9]+", (title or "").lower()))
+
+
+def shingles(title: str) -> Set[str]:
+    """Character trigrams of the normalized title"""
+    text = normalize_title(title)
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def title_similarity(first: str, second: str) -> float:
+    """Exact Jaccard similarity of two titles' shingle sets"""
+    a, b = shingles(first), shingles(second)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(title: str) -> Optional[np.ndarray]:
+    """MinHash signature of a title, or None if it has no shingles"""
+    items = shingles(title)
+    if not items:
+        return None
+    hashes = np.array([zlib.crc32(item.encode("utf-8")) for item in items], dtype=np.uint64)
+    # (a * x + b) mod p for every permutation and shingle; a and b are below
+    # 2^31 and x below 2^32, so nothing overflows 64 bits
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def _band_keys(signature: np.ndarray) -> List[bytes]:
+    return [signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+
+class TitleLSH:
+    """LSH buckets of title signatures; lookups only touch colliding buckets"""
+
+    def __init__(self):
+        self.buckets: List[Dict[bytes, Set[int]]] = [defaultdict(set) for _ in range(BANDS)]
+        self.signatures: Dict[int, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def add(self, task_id: int, title: str):
+        self.remove(task_id)
+        signature = minhash(title)
+        if signature is None:
+            return
+        self.signatures[task_id] = signature
+        for band, key in enumerate(_band_keys(signature)):
+            self.buckets[band][key].add(task_id)
+
+    def remove(self, task_id: int):
+        signature = self.signatures.pop(task_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(_band_keys(signature)):
+            bucket = self.buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(task_id)
+                if not bucket:
+                    del self.buckets[band][key]
+
+    def candidates(self, title: str, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        (task_id, estimated similarity) of tasks sharing a band and scoring at
+        least `min_score`, most similar first
+        """
+        signature = minhash(title)
+        if signature is None:
+            return []
+        found: Set[int] = set()
+        for band, key in enumerate(_band_keys(signature)):
+            found.update(self.buckets[band].get(key, ()))
+        if not found:
+            return []
+        ids = list(found)
+        scores = (np.stack([self.signatures[task_id] for task_id in ids]) == signature).mean(axis=1)
+        keep = np.flatnonzero(scores >= min_score)
+        keep = keep[np.argsort(scores[keep])[::-1]]
+        return [(ids[i], float(scores[i])) for i in keep]
+
+
+class TenantTitles:
+    __slots__ = ("lsh", "last_id", "lock")
+
+    def __init__(self):
+        self.lsh = TitleLSH()
+        self.last_id: Optional[int] = None
+        self.lock = threading.Lock()
+
+
+class DuplicateIndex:
+    """
+    Per-tenant LSH index over the titles of open (incomplete) tasks.
+
+    The index is a hint: writes in this process update it directly, and
+    tasks created elsewhere (other workers, imports) are picked up by
+    reading only rows with an id above the last one seen. Entries that went
+    stale through another worker's update or delete are caught when the
+    caller re-checks candidates against the database.
+    """
+
+    def __init__(self):
+        self._tenants: Dict[str, TenantTitles] = {}
+        self._lock = threading.Lock()
+
+    def _tenant(self, tenant_id: str) -> TenantTitles:
+        with self._lock:
+            entry = self._tenants.get(tenant_id)
+            if entry is None:
+                entry = self._tenants[tenant_id] = TenantTitles()
+            return entry
+
+    def sync(self, db: Session, tenant_id: str) -> TenantTitles:
+        entry = self._tenant(tenant_id)
+        with entry.lock:
+            query = select(Task.id, Task.title).where(
+                Task.tenant_id == tenant_id,
+                Task.completed == False,
+                Task.recurrence.is_(None),
+                Task.recurrence_id.is_(None),
+            )
+            if entry.last_id is not None:
+                query = query.where(Task.id > entry.last_id)
+            for task_id, title in db.execute(query.order_by(Task.id)):
+                entry.lsh.add(task_id, title)
+                entry.last_id = task_id
+            if entry.last_id is None:
+                entry.last_id = 0
+        return entry
+
+    def candidates(self, db: Session, tenant_id: str, title: str, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        entry = self.sync(db, tenant_id)
+        with entry.lock:
+            return entry.lsh.candidates(title, min_score)
+
+    def add(self, tenant_id: str, task_id: int, title: str):
+        entry = self._tenant(tenant_id)
+        with entry.lock:
+            entry.lsh.add(task_id, title)
+
+    def remove(self, tenant_id: str, task_id: int):
+        entry = self._tenant(tenant_id)
+        with entry.lock:
+            entry.lsh.remove(task_id)
+
+
+def find_duplicate_groups(titles: List[Tuple[int, str]], threshold: float) -> List[List[int]]:
+    """
+    Group near-duplicate titles. Each group lists task IDs in the order
+    given, so the first is the one to keep. Runs in roughly linear time by
+    only comparing tasks that share an LSH bucket.
+    """
+    lsh = TitleLSH()
+    parent: Dict[int, int] = {}
+
+    def find(task_id: int) -> int:
+        while parent[task_id] != task_id:
+            parent[task_id] = parent[parent[task_id]]
+            task_id = parent[task_id]
+        return task_id
+
+    by_id = dict(titles)
+    order = {task_id: position for position, (task_id, _) in enumerate(titles)}
+    for task_id, title in titles:
+        parent[task_id] = task_id
+        for other_id, _ in lsh.candidates(title, threshold - ESTIMATE_SLACK):
+            root, other_root = find(task_id), find(other_id)
+            # Tasks already in the same group need no exact comparison
+            if root != other_root and title_similarity(title, by_id[other_id]) >= threshold:
+                # Keep the earliest task as the root of the group
+                if order[root] < order[other_root]:
+                    root, other_root = other_root, root
+                parent[root] = other_root
+        lsh.add(task_id, title)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for task_id, _ in titles:
+        groups[find(task_id)].append(task_id)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+duplicate_index = DuplicateIndex()
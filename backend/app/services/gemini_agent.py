@@ -1,31 +1,111 @@
-import os
-from typing import Dict, Any
-import google.generativeai as genai
-from app.services.langgraph_tools import create_task_tool, list_tasks_tool
+import threading
+from functools import lru_cache
+from typing import Dict, Any, Optional
+from app.services.langgraph_tools import create_task_tool, list_tasks_tool, search_tasks_tool, update_task_tool
+from app.services.conversation import conversation_store
+from app.services.llm_client import ResilientLLMClient, create_llm_client
+from app.services.llm_provider import gemini_configured, get_llm_provider
+from app.services.rate_limit import llm_slots
+from app.models.task import DEFAULT_TENANT
+from app.utils.config import settings
 import re
 
+ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5}
+
+# "mark task 3 as done", "mark that one complete", "mark the second one finished"
+COMPLETION_PATTERNS = [
+    r"\bmark (?P<ref>.+?) (?:as )?(?:done|complete|completed|finished)\b",
+    r"\b(?:complete|finish|check off) (?P<ref>task #?\d+|#\d+|that(?: one| task)?|this(?: one| task)?|it|the (?:first|second|third|fourth|fifth|last) (?:one|task))\b",
+]
+
+# The only task references that are resolved; anything else is asked about
+EXPLICIT_REFERENCE = r"(?:the )?(?:task #?|#)(?P<id>\d+)"
+ORDINAL_REFERENCE = r"the (?P<ordinal>first|second|third|fourth|fifth|last) (?:one|task)"
+ANAPHORIC_REFERENCE = r"(?:it|(?:this|that)(?: one| task)?)"
+
+# "what do I have about the frontend refactor", "find tasks related to billing"
+SEARCH_PATTERNS = [
+    r"\b(?:what|which) (?:tasks )?(?:do i have|have i got|is there) (?:about|on|for|related to|regarding) (?P<query>.+)",
+    r"\b(?:anything|tasks?|something) (?:about|related to|regarding) (?P<query>.+)",
+    r"^(?:find|search(?: for)?) (?:my )?(?:tasks? )?(?:about |for |related to |regarding )?(?P<query>.+)",
+]
+
+# Messages starting like this create tasks even if they mention "about"
+CREATION_PREFIXES = ("create", "make", "add", "new task", "remind me")
+
 class TaskAgent:
     def __init__(self):
-        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
-        if self.gemini_api_key and self.gemini_api_key != "your_gemini_api_key_here":
-            genai.configure(api_key=self.gemini_api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-            self.use_ai = True
-        else:
-            self.use_ai = False
+        # Only check the key here; the Gemini SDK is loaded on first AI use
+        self.use_ai = gemini_configured()
+        self._llm: Optional[ResilientLLMClient] = None
+        self._llm_lock = threading.Lock()
+        if not self.use_ai:
             print("Warning: GEMINI_API_KEY not set or using placeholder. Using fallback mode.")
+    
+    @property
+    def llm(self) -> ResilientLLMClient:
+        """Resilient client around the LLM provider, created on first use"""
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    provider = get_llm_provider()
+                    self._llm = create_llm_client(
+                        lambda prompt: provider.generate(prompt, timeout=settings.LLM_TIMEOUT_SECONDS)
+                    )
+        return self._llm
+    
+    def _llm_or_none(self) -> Optional[ResilientLLMClient]:
+        """The LLM client, or None if the provider can't be set up (missing SDK, bad key)"""
+        try:
+            return self.llm
+        except Exception as e:
+            print(f"Warning: could not set up the LLM provider ({e}). Using fallback mode.")
+            self.use_ai = False
+            return None
+    
+    def warm_up(self):
+        """Load the LLM SDK ahead of the first chat request"""
+        if self.use_ai:
+            self._llm_or_none()
         
-    def process_message(self, message: str) -> Dict[str, Any]:
+    def process_message(self, message: str, session_id: Optional[str] = None, tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
         """Process a user message and return a response"""
+        # Namespace sessions by tenant so one tenant can never resume another's
+        if session_id:
+            session_id = f"{tenant_id}:{session_id}"
+        result = self._route_message(message, session_id, tenant_id)
+        
+        # Remember the exchange so follow-up messages can refer back to it
+        if session_id:
+            conversation_store.add_turn(session_id, "user", message)
+            conversation_store.add_turn(session_id, "assistant", result["response"])
+            task_data = result.get("task_data")
+            if isinstance(task_data, dict) and task_data.get("id"):
+                conversation_store.remember_tasks(session_id, [task_data["id"]])
+        
+        return result
+    
+    def _route_message(self, message: str, session_id: Optional[str], tenant_id: str) -> Dict[str, Any]:
+        """Dispatch a message to the matching intent handler"""
         message_lower = message.lower().strip()
         
+        # Follow-ups like "mark that one done" must win over creation keywords
+        completion_ref = self._match_task_completion(message_lower)
+        if completion_ref:
+            return self._handle_task_completion(completion_ref, session_id, tenant_id)
+        
+        # "What do I have about X" searches tasks by meaning
+        search_query = self._match_task_search(message_lower)
+        if search_query:
+            return self._handle_task_search(search_query, session_id, tenant_id)
+        
         # Check if this is a task creation request
         if self._is_task_creation_request(message_lower):
-            return self._handle_task_creation(message)
+            return self._handle_task_creation(message, tenant_id)
         
         # Check if this is a task listing request
         if self._is_task_listing_request(message_lower):
-            return self._handle_task_listing(message)
+            return self._handle_task_listing(message, session_id, tenant_id)
             
         # Handle React learning requests
         if any(keyword in message_lower for keyword in ['learn react', 'react js', 'react.js', 'reactjs', 'react']):
@@ -45,10 +125,119 @@ class TaskAgent:
         
         # Use AI if available, otherwise use fallback
         if self.use_ai:
-            return self._process_with_ai(message)
+            return self._process_with_ai(message, session_id)
         else:
             return self._fallback_response(message)
     
+    def _match_task_completion(self, message: str) -> Optional[str]:
+        """Return the task reference if the message asks to complete a task"""
+        # "Remind me to mark the invoices as done" is a new task, not a completion
+        if message.startswith(CREATION_PREFIXES):
+            return None
+        for pattern in COMPLETION_PATTERNS:
+            match = re.search(pattern, message)
+            if match:
+                return match.group("ref").strip()
+        return None
+    
+    def _resolve_task_reference(self, reference: str, session_id: Optional[str]) -> Optional[int]:
+        """
+        Resolve "task 3", "#3", "that one" or "the second one" to a task ID.
+        Anything else (e.g. "the 3 reports") gives None, so the user is asked
+        which task they mean instead of a guess completing the wrong one.
+        """
+        explicit = re.fullmatch(EXPLICIT_REFERENCE, reference)
+        if explicit:
+            return int(explicit.group("id"))
+        
+        ordinal = re.fullmatch(ORDINAL_REFERENCE, reference)
+        if not ordinal and not re.fullmatch(ANAPHORIC_REFERENCE, reference):
+            return None
+        if not session_id:
+            return None
+        if ordinal:
+            # Ordinals count through the last list shown, in the order shown
+            listing = conversation_store.last_listing(session_id)
+            word = ordinal.group("ordinal")
+            if word == "last":
+                return listing[-1] if listing else None
+            position = ORDINALS[word]
+            return listing[position - 1] if position <= len(listing) else None
+        # "it", "that one": the most recently referenced task, which is last
+        recent = conversation_store.recent_task_ids(session_id)
+        return recent[-1] if recent else None
+    
+    def _handle_task_completion(self, reference: str, session_id: Optional[str], tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
+        """Handle requests to mark a task as done"""
+        task_id = self._resolve_task_reference(reference, session_id)
+        if task_id is None:
+            return {
+                "response": "Which task should I mark as done? You can say 'Mark task 3 as done', or ask me to show your tasks first.",
+                "tasks_updated": False,
+                "task_data": None
+            }
+        
+        result = update_task_tool(task_id=task_id, completed=True, tenant_id=tenant_id)
+        if not result["success"]:
+            return {
+                "response": f"Sorry, I couldn't update that task. Error: {result.get('error', 'Unknown error')}",
+                "tasks_updated": False,
+                "task_data": None
+            }
+        
+        return {
+            "response": f"✅ Marked **{result['task']['title']}** as done.",
+            "tasks_updated": True,
+            "task_data": result["task"]
+        }
+    
+    def _match_task_search(self, message: str) -> Optional[str]:
+        """Return the search query if the message asks which tasks are about something"""
+        if message.startswith(CREATION_PREFIXES):
+            return None
+        for pattern in SEARCH_PATTERNS:
+            match = re.search(pattern, message)
+            if match:
+                query = match.group("query").strip(" .?!")
+                if query:
+                    return query
+        return None
+    
+    def _handle_task_search(self, query: str, session_id: Optional[str] = None, tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
+        """Handle "what do I have about X" requests"""
+        result = search_tasks_tool(query=query, limit=5, tenant_id=tenant_id)
+        if not result["success"]:
+            return {
+                "response": f"Sorry, I couldn't search your tasks. Error: {result.get('error', 'Unknown error')}",
+                "tasks_updated": False,
+                "task_data": None
+            }
+        
+        tasks = result["tasks"]
+        if not tasks:
+            return {
+                "response": f"I couldn't find any tasks about **{query}**. Say 'Show me my tasks' to see everything.",
+                "tasks_updated": False,
+                "task_data": None
+            }
+        
+        response = f"🔎 **Tasks about {query}:**\n\n"
+        for i, task in enumerate(tasks, 1):
+            status = "✅" if task.get("completed") else "⭕"
+            response += f"{i}. {status} **{task.get('title', 'Untitled')}**"
+            if task.get("category"):
+                response += f" ({task['category']})"
+            response += "\n"
+        
+        if session_id:
+            conversation_store.remember_listing(session_id, [task["id"] for task in tasks])
+        
+        return {
+            "response": response,
+            "tasks_updated": False,
+            "task_data": tasks
+        }
+    
     def _is_task_creation_request(self, message: str) -> bool:
         """Check if the message is requesting task creation"""
         creation_keywords = [
@@ -126,7 +315,7 @@ class TaskAgent:
             "category": category
         }
     
-    def _handle_task_creation(self, message: str) -> Dict[str, Any]:
+    def _handle_task_creation(self, message: str, tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
         """Handle task creation requests"""
         try:
             # Extract task details from the message
@@ -144,9 +333,17 @@ class TaskAgent:
                 title=task_details["title"],
                 description=task_details["description"],
                 priority=task_details["priority"],
-                category=task_details["category"]
+                category=task_details["category"],
+                tenant_id=tenant_id
             )
             
+            if result["success"] and result["merged"]:
+                return {
+                    "response": f"📌 You already have **{result['task']['title']}** (task #{result['task']['id']}), so I updated it instead of adding a duplicate.",
+                    "tasks_updated": True,
+                    "task_data": result["task"]
+                }
+            
             if result["success"]:
                 response = f"✅ Great! I've created a task for you:\n\n**{task_details['title']}**"
                 if task_details["category"]:
@@ -156,6 +353,10 @@ class TaskAgent:
                 
                 response += "\n\nThe task has been added to your task list. You can see it on the right side of the screen!"
                 
+                duplicate = result["duplicate_of"]
+                if duplicate:
+                    response += f"\n\n⚠️ This looks like a repeat of **{duplicate['title']}** (task #{duplicate['id']})."
+                
                 return {
                     "response": response,
                     "tasks_updated": True,
@@ -175,10 +376,10 @@ class TaskAgent:
                 "task_data": None
             }
     
-    def _handle_task_listing(self, message: str) -> Dict[str, Any]:
+    def _handle_task_listing(self, message: str, session_id: Optional[str] = None, tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
         """Handle task listing requests"""
         try:
-            result = list_tasks_tool(limit=10)
+            result = list_tasks_tool(limit=10, tenant_id=tenant_id)
             
             if result["success"]:
                 tasks = result.get("tasks", [])
@@ -197,6 +398,9 @@ class TaskAgent:
                         response += f" ({task['category']})"
                     response += "\n"
                 
+                if session_id:
+                    conversation_store.remember_listing(session_id, [task["id"] for task in tasks[:5]])
+                
                 if len(tasks) > 5:
                     response += f"\n... and {len(tasks) - 5} more tasks. Check the task list on the right to see all!"
                 
@@ -219,11 +423,33 @@ class TaskAgent:
                 "task_data": None
             }
     
-    def _process_with_ai(self, message: str) -> Dict[str, Any]:
+    def _process_with_ai(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
         """Process message using Gemini AI"""
+        # While the provider is known to be unhealthy, answer immediately
+        llm = self._llm_or_none()
+        if llm is None or not llm.available:
+            return self._fallback_response(message)
+        
+        # Reject rather than queue when too many AI calls are already in flight
+        with llm_slots.slot():
+            return self._generate_ai_response(message, session_id)
+    
+    def _generate_ai_response(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Call Gemini, falling back to canned responses on failure"""
         try:
+            # Include the bounded conversation history so follow-ups make sense
+            history = ""
+            if session_id:
+                turns = conversation_store.history(session_id)
+                if turns:
+                    history = "Conversation so far:\n" + "\n".join(
+                        f"{role.capitalize()}: {content}" for role, content in turns
+                    ) + "\n\n"
+            
             # Create a prompt that helps the AI understand the context
-            prompt = f"""You are a helpful AI assistant for a task management application. The user said: "{message}"
+            prompt = f"""You are a helpful AI assistant for a task management application.
+
+{history}The user said: "{message}"
 
 You can help with:
 1. Task management (creating, listing, updating tasks)
@@ -236,10 +462,10 @@ If the user wants to see their tasks, I'll handle that separately.
 Provide a helpful, friendly response. If it's about React or programming, include practical advice or code examples.
 Keep responses concise but informative."""
             
-            response = self.model.generate_content(prompt)
+            response_text = self.llm.generate(prompt)
             
             return {
-                "response": response.text,
+                "response": response_text,
                 "tasks_updated": False,
                 "task_data": None
             }
@@ -319,5 +545,7 @@ function Counter() {
 **What specific React topic would you like to dive deeper into?** 🤔"""
         return react_content
 
-# Create a global instance
-task_agent = TaskAgent()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_task_agent() -> TaskAgent:
+    """Return the shared agent, creating it on first use"""
+    return TaskAgent()
\ No newline at end of file
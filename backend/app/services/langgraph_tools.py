@@ -4,11 +4,12 @@ from datetime import datetime
 from app.services.tasks import TaskService
 from app.schemas.task import TaskCreate, TaskUpdate, TaskFilter
 from app.db.session import SessionLocal
+from app.models.task import DEFAULT_TENANT
 
 class TaskTools:
-    def __init__(self):
+    def __init__(self, tenant_id: str = DEFAULT_TENANT):
         self.db = SessionLocal()
-        self.task_service = TaskService(self.db)
+        self.task_service = TaskService(self.db, tenant_id=tenant_id)
     
     def close_db(self):
         if self.db:
@@ -19,7 +20,10 @@ def create_task_tool(
     description: str = "",
     priority: str = "medium",
     category: str = "",
-    due_date: str = ""
+    due_date: str = "",
+    recurrence: str = "",
+    on_duplicate: str = "",
+    tenant_id: str = DEFAULT_TENANT
 ) -> Dict[str, Any]:
     """
     Create a new task.
@@ -30,12 +34,19 @@ def create_task_tool(
         priority: Priority level (low, medium, high)
         category: Category or tag for the task
         due_date: Due date in ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)
+        recurrence: Repeat rule for recurring tasks, e.g. "FREQ=WEEKLY;BYDAY=MO"
+            or "FREQ=MONTHLY;BYMONTHDAY=1"; the first occurrence is due_date
+        on_duplicate: What to do if a similar open task exists (allow, warn, merge);
+            defaults to the server's DEDUPE_POLICY
+        tenant_id: Tenant that owns the task
     
     Returns:
-        Dictionary with task details and success status
+        Dictionary with task details and success status. When a similar
+        task exists, "duplicate_of" holds its ID and "merged" tells whether
+        the new task was folded into it instead of being created.
     """
     try:
-        task_tools = TaskTools()
+        task_tools = TaskTools(tenant_id)
         
         # Parse due_date if provided
         parsed_due_date = None
@@ -50,16 +61,22 @@ def create_task_tool(
             description=description or None,
             priority=priority,
             category=category or None,
-            due_date=parsed_due_date
+            due_date=parsed_due_date,
+            recurrence=recurrence or None
         )
         
-        task = task_tools.task_service.create_task(task_data)
+        task, duplicate = task_tools.task_service.create_or_merge_task(task_data, on_duplicate or None)
+        merged = task is duplicate
+        task_dict = task.to_dict()
+        duplicate_dict = duplicate.to_dict() if duplicate is not None else None
         task_tools.close_db()
         
         return {
             "success": True,
-            "message": f"Task '{title}' created successfully!",
-            "task": task.to_dict()
+            "message": f"Merged into existing task {task_dict['id']}" if merged else f"Task '{title}' created successfully!",
+            "task": task_dict,
+            "duplicate_of": duplicate_dict,
+            "merged": merged
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -71,7 +88,8 @@ def update_task_tool(
     completed: Optional[bool] = None,
     priority: str = "",
     category: str = "",
-    due_date: str = ""
+    due_date: str = "",
+    tenant_id: str = DEFAULT_TENANT
 ) -> Dict[str, Any]:
     """
     Update an existing task.
@@ -84,12 +102,13 @@ def update_task_tool(
         priority: New priority level (low, medium, high)
         category: New category for the task
         due_date: New due date in ISO format
+        tenant_id: Tenant that owns the task
     
     Returns:
         Dictionary with updated task details and success status
     """
     try:
-        task_tools = TaskTools()
+        task_tools = TaskTools(tenant_id)
         
         # Parse due_date if provided
         parsed_due_date = None
@@ -131,18 +150,19 @@ def update_task_tool(
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def delete_task_tool(task_id: int) -> Dict[str, Any]:
+def delete_task_tool(task_id: int, tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
     """
     Delete a task.
     
     Args:
         task_id: ID of the task to delete (required)
+        tenant_id: Tenant that owns the task
     
     Returns:
         Dictionary with success status and message
     """
     try:
-        task_tools = TaskTools()
+        task_tools = TaskTools(tenant_id)
         success = task_tools.task_service.delete_task(task_id)
         task_tools.close_db()
         
@@ -161,7 +181,8 @@ def list_tasks_tool(
     priority: str = "",
     category: str = "",
     search: str = "",
-    limit: int = 50
+    limit: int = 50,
+    tenant_id: str = DEFAULT_TENANT
 ) -> Dict[str, Any]:
     """
     List tasks with optional filtering.
@@ -172,12 +193,13 @@ def list_tasks_tool(
         category: Filter by category
         search: Search in title and description
         limit: Maximum number of tasks to return
+        tenant_id: Tenant whose tasks are listed
     
     Returns:
         Dictionary with list of tasks and success status
     """
     try:
-        task_tools = TaskTools()
+        task_tools = TaskTools(tenant_id)
         
         filters = TaskFilter(
             completed=completed,
@@ -202,7 +224,8 @@ def list_tasks_tool(
 
 def filter_tasks_tool(
     filter_type: str,
-    filter_value: str = ""
+    filter_value: str = "",
+    tenant_id: str = DEFAULT_TENANT
 ) -> Dict[str, Any]:
     """
     Filter tasks by specific criteria.
@@ -210,12 +233,13 @@ def filter_tasks_tool(
     Args:
         filter_type: Type of filter (priority, category, completed, overdue, search)
         filter_value: Value to filter by
+        tenant_id: Tenant whose tasks are searched
     
     Returns:
         Dictionary with filtered tasks and success status
     """
     try:
-        task_tools = TaskTools()
+        task_tools = TaskTools(tenant_id)
         
         if filter_type == "priority":
             tasks = task_tools.task_service.get_tasks_by_priority(filter_value)
@@ -245,11 +269,45 @@ def filter_tasks_tool(
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def search_tasks_tool(
+    query: str,
+    limit: int = 10,
+    tenant_id: str = DEFAULT_TENANT
+) -> Dict[str, Any]:
+    """
+    Find tasks whose title or description is about the query, by meaning
+    rather than exact wording.
+    
+    Args:
+        query: What the tasks should be about (required)
+        limit: Maximum number of tasks to return
+        tenant_id: Tenant whose tasks are searched
+    
+    Returns:
+        Dictionary with matching tasks, best match first, and success status
+    """
+    try:
+        task_tools = TaskTools(tenant_id)
+        tasks = task_tools.task_service.semantic_search(query, limit=limit)
+        task_tools.close_db()
+        
+        task_list = [task.to_dict() for task in tasks]
+        
+        return {
+            "success": True,
+            "message": f"Found {len(task_list)} tasks about '{query}'",
+            "tasks": task_list,
+            "count": len(task_list)
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 # List of all available tools
 TASK_TOOLS = [
     create_task_tool,
     update_task_tool,
     delete_task_tool,
     list_tasks_tool,
-    filter_tasks_tool
+    filter_tasks_tool,
+    search_tasks_tool
 ]
\ No newline at end of file
@@ -0,0 +1,163 @@
+# Resilient wrapper around blocking LLM calls
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from app.utils.config import settings
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the LLM provider cannot produce a response in time"""
+
+
+class CircuitBreaker:
+    """
+    Classic closed/open/half-open breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds, then lets a single trial call
+    through. A successful trial closes it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be let through, without changing state"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return self.state == self.CLOSED
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let exactly one trial request probe the provider
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ResilientLLMClient:
+    """
+    Calls a blocking `generate(prompt) -> str` function with a per-attempt
+    deadline, jittered exponential-backoff retries, optional hedged requests
+    and a circuit breaker.
+
+    Timed-out calls cannot be cancelled; their worker threads are abandoned
+    and finish in the background, so the executor is sized for that.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], str],
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        hedge_after: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_workers: int = 16,
+    ):
+        self._generate = generate
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    @property
+    def available(self) -> bool:
+        """False while the breaker is open, so callers can skip the call entirely"""
+        return self.breaker.is_available()
+
+    def generate(self, prompt: str) -> str:
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow_request():
+                raise LLMUnavailableError("LLM provider circuit is open")
+
+            try:
+                result = self._attempt(prompt)
+            except Exception as e:
+                last_error = e
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+                return result
+
+            if attempt < self.max_retries:
+                # Full jitter keeps retries from many clients from synchronizing
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+        raise LLMUnavailableError(f"LLM call failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def _attempt(self, prompt: str) -> str:
+        """Run one attempt, hedging with a second request if the first is slow"""
+        deadline = time.monotonic() + self.timeout
+        pending = {self._executor.submit(self._generate, prompt)}
+        hedged = not self.hedge_after
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            wait_for = remaining if hedged else min(remaining, self.hedge_after)
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+
+            if done and not pending:
+                raise error
+
+            if not hedged and not done:
+                pending.add(self._executor.submit(self._generate, prompt))
+                hedged = True
+
+        raise TimeoutError(f"LLM call exceeded {self.timeout}s deadline")
+
+
+def create_llm_client(generate: Callable[[str], str]) -> ResilientLLMClient:
+    """Build a client configured from Settings"""
+    return ResilientLLMClient(
+        generate,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        max_retries=settings.LLM_MAX_RETRIES,
+        backoff=settings.LLM_RETRY_BACKOFF_SECONDS,
+        hedge_after=settings.LLM_HEDGE_AFTER_SECONDS or None,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.LLM_BREAKER_RESET_SECONDS,
+        ),
+        max_workers=max(2, settings.MAX_CONCURRENT_LLM_CALLS * 2),
+    )
@@ -0,0 +1,49 @@
+# LLM providers, loaded lazily so the SDK import is paid on first use
+import threading
+from typing import Optional
+
+from app.utils.config import settings
+
+
+class LLMProvider:
+    """Interface for text-generation backends used by the chat agent"""
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini via the google-generativeai SDK"""
+
+    def __init__(self, api_key: str, model_name: str = "gemini-pro"):
+        # Importing the SDK pulls in grpc/protobuf and is the slowest part of
+        # agent setup, so it happens here rather than at module import.
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        request_options = {"timeout": timeout} if timeout else None
+        response = self.model.generate_content(prompt, request_options=request_options)
+        return response.text
+
+
+def gemini_configured() -> bool:
+    """Whether a real Gemini API key is configured, without importing the SDK"""
+    api_key = settings.GEMINI_API_KEY
+    return bool(api_key) and api_key != "your_gemini_api_key_here"
+
+
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_llm_provider() -> Optional[LLMProvider]:
+    """Return the shared provider, creating it on first call; None when not configured"""
+    global _provider
+    if _provider is None and gemini_configured():
+        with _provider_lock:
+            if _provider is None:
+                _provider = GeminiProvider(settings.GEMINI_API_KEY)
+    return _provider
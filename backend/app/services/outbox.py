@@ -0,0 +1,219 @@
+# Transactional outbox for task events and the relay that delivers them
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, event, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.db.session import RoutingSession, SessionLocal
+from app.models.task_event import OutboxState, TaskEvent
+
+# Relays in this process, woken up when a session commits new events
+_relays: List["OutboxRelay"] = []
+_relays_lock = threading.Lock()
+
+
+def record_event(db: Session, tenant_id: str, event_type: str, **data: Any):
+    """
+    Add an event to the session. It is committed together with the task
+    change it describes, so a change is never saved without its event.
+    """
+    payload = json.dumps({"type": event_type, **data}, default=str)
+    db.add(TaskEvent(tenant_id=tenant_id, event_type=event_type, payload=payload))
+    db.info["outbox_dirty"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _notify_relays(session):
+    if session.info.pop("outbox_dirty", False):
+        with _relays_lock:
+            for relay in _relays:
+                relay.notify()
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("outbox_dirty", None)
+
+
+def event_message(seq: int, payload: str) -> str:
+    """The event as sent to clients: its stored payload with the seq added"""
+    return f'{{"seq": {seq}, {payload[1:]}'
+
+
+def replay_events(db: Session, tenant_id: str, after: int, limit: int = 500, lookback: int = 0) -> Dict[str, Any]:
+    """
+    Events for a tenant with seq greater than `after`, in order. With
+    `lookback`, events up to that many seqs below `after` are included too:
+    a transaction can commit after later seqs were delivered, so clients
+    replay a little below their cursor and skip the seqs they have seen.
+    `truncated` means some of the events after `after` were already pruned,
+    so the client should reload its tasks instead.
+    """
+    rows = db.execute(
+        select(TaskEvent.seq, TaskEvent.payload)
+        .where(TaskEvent.tenant_id == tenant_id, TaskEvent.seq > max(0, after - lookback))
+        .order_by(TaskEvent.seq)
+        .limit(limit)
+    ).all()
+    state = db.get(OutboxState, 1)
+    return {
+        "events": [json.loads(event_message(seq, payload)) for seq, payload in rows],
+        "truncated": state is not None and after < state.pruned_through,
+        "has_more": len(rows) == limit,
+    }
+
+
+class OutboxRelay:
+    """
+    Delivers committed outbox rows to WebSocket clients, in seq order.
+
+    Each worker process runs its own relay for its own connections and
+    starts from the newest event, since clients catch up on anything older
+    with replay_events. Rows are read in batches and each tenant receives one
+    message per batch. A message is either a single event or
+    {"type": "batch", "events": [...]}, which keeps per-event overhead low
+    during write bursts.
+
+    Delivery is at-least-once and clients should ignore seqs they have
+    already seen. A commit may become visible after a later seq (concurrent
+    transactions), so skipped seqs are re-checked for `gap_timeout` seconds
+    before being given up as rolled back.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[str, str], Awaitable[None]],
+        batch_size: int = 500,
+        poll_interval: float = 0.5,
+        gap_timeout: float = 5.0,
+        retention: timedelta = timedelta(hours=24),
+    ):
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.gap_timeout = gap_timeout
+        self.retention = retention
+        self.cursor: Optional[int] = None
+        # Skipped seqs that may still commit, with when to stop waiting
+        self._gaps: "OrderedDict[int, float]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._next_prune = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cursor": self.cursor, "pending_gaps": len(self._gaps)}
+
+    def notify(self):
+        """Wake the relay after a commit; safe to call from any thread"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+        """Relay events until cancelled"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        with _relays_lock:
+            _relays.append(self)
+        try:
+            if self.cursor is None:
+                self.cursor = await run_in_threadpool(self._latest_seq)
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await self.relay_pending()
+                    if time.monotonic() >= self._next_prune:
+                        self._next_prune = time.monotonic() + 60
+                        await run_in_threadpool(self._prune)
+                except Exception as e:
+                    print(f"Warning: Outbox relay failed: {e}")
+        finally:
+            with _relays_lock:
+                _relays.remove(self)
+
+    async def relay_pending(self):
+        """Deliver everything committed since the last call"""
+        while True:
+            rows = await run_in_threadpool(self._fetch)
+            if rows:
+                await self._deliver(rows)
+            if len(rows) < self.batch_size:
+                return
+
+    async def _deliver(self, rows):
+        by_tenant: "OrderedDict[str, List[str]]" = OrderedDict()
+        for seq, tenant_id, payload in rows:
+            by_tenant.setdefault(tenant_id, []).append(event_message(seq, payload))
+        for tenant_id, messages in by_tenant.items():
+            if len(messages) == 1:
+                await self.deliver(messages[0], tenant_id)
+            else:
+                await self.deliver('{"type": "batch", "events": [' + ", ".join(messages) + "]}", tenant_id)
+
+    def _fetch(self):
+        now = time.monotonic()
+        while self._gaps and next(iter(self._gaps.values())) <= now:
+            self._gaps.popitem(last=False)
+
+        condition = TaskEvent.seq > self.cursor
+        if self._gaps:
+            condition = or_(condition, TaskEvent.seq.in_(list(self._gaps)))
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(TaskEvent.seq, TaskEvent.tenant_id, TaskEvent.payload)
+                .where(condition)
+                .order_by(TaskEvent.seq)
+                .limit(self.batch_size)
+            ).all()
+        finally:
+            db.close()
+
+        for seq, _, _ in rows:
+            if seq in self._gaps:
+                del self._gaps[seq]
+                continue
+            for missing in range(self.cursor + 1, min(seq, self.cursor + 1 + self.batch_size)):
+                self._gaps[missing] = now + self.gap_timeout
+            self.cursor = max(self.cursor, seq)
+        return rows
+
+    def _latest_seq(self) -> int:
+        db = SessionLocal()
+        try:
+            return db.execute(select(func.max(TaskEvent.seq))).scalar() or 0
+        finally:
+            db.close()
+
+    def _prune(self):
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - self.retention
+            pruned = db.execute(select(func.max(TaskEvent.seq)).where(TaskEvent.created_at < cutoff)).scalar()
+            if pruned is not None and self.cursor is not None:
+                # Keep the row at the cursor, so the table is never emptied and
+                # new seqs can't go back below it on any backend
+                pruned = min(pruned, self.cursor - 1)
+            if pruned is None or pruned < 1:
+                return
+            # Record how far events are gone, so replays from before it are
+            # reported as truncated even once the table is empty
+            state = db.get(OutboxState, 1, with_for_update=True)
+            if state is None:
+                db.add(OutboxState(id=1, pruned_through=pruned))
+            elif state.pruned_through < pruned:
+                state.pruned_through = pruned
+            db.execute(delete(TaskEvent).where(TaskEvent.seq <= pruned))
+            db.commit()
+        finally:
+            db.close()
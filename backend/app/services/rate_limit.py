@@ -0,0 +1,158 @@
+# Token-bucket rate limiting and admission control
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.utils.config import settings
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is rejected by a limiter"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InMemoryBucketStore:
+    """
+    Token buckets kept in process memory.
+
+    Buckets are stored as [tokens, last_refill] pairs in an LRU-ordered dict,
+    so the number of tracked clients stays bounded.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """Consume tokens; return 0 if allowed, else seconds until enough tokens refill"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [capacity, now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / rate
+
+
+# Atomic refill-and-take so every worker sees the same bucket
+_REDIS_TAKE_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared between processes through Redis"""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the 'redis' package is not installed") from e
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE_SCRIPT)
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        return float(self._take(keys=[f"ratelimit:{key}"], args=[rate, capacity, cost, time.time()]))
+
+
+class RateLimiter:
+    """Per-client token bucket backed by a process-wide bucket for the same action"""
+
+    def __init__(self, name: str, per_minute: int, burst: int, global_per_minute: int, store=None):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.global_rate = global_per_minute / 60.0
+        # Allow roughly one second's worth of global traffic to arrive at once
+        self.global_burst = max(1.0, self.global_rate)
+        self.store = store or InMemoryBucketStore()
+
+    def check(self, client_id: str):
+        """Admit one request for the client or raise RateLimitExceeded"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+
+        wait = self.store.take(f"{self.name}:client:{client_id}", self.rate, self.burst)
+        if wait:
+            raise RateLimitExceeded(f"Too many {self.name} requests", retry_after=wait)
+
+        wait = self.store.take(f"{self.name}:global", self.global_rate, self.global_burst)
+        if wait:
+            raise RateLimitExceeded(f"Server is busy handling {self.name} requests", retry_after=wait)
+
+
+class ConcurrencyLimiter:
+    """Non-blocking cap on concurrent operations; callers are rejected, never queued"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(blocking=False):
+            raise RateLimitExceeded(f"Too many concurrent {self.name} requests", retry_after=1.0)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+def _create_store():
+    if settings.RATE_LIMIT_REDIS_URL:
+        return RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+    return InMemoryBucketStore()
+
+
+_store = _create_store()
+
+chat_limiter = RateLimiter(
+    "chat",
+    per_minute=settings.CHAT_RATE_LIMIT_PER_MINUTE,
+    burst=settings.CHAT_RATE_LIMIT_BURST,
+    global_per_minute=settings.GLOBAL_CHAT_RATE_LIMIT_PER_MINUTE,
+    store=_store,
+)
+
+write_limiter = RateLimiter(
+    "write",
+    per_minute=settings.WRITE_RATE_LIMIT_PER_MINUTE,
+    burst=settings.WRITE_RATE_LIMIT_BURST,
+    global_per_minute=settings.GLOBAL_WRITE_RATE_LIMIT_PER_MINUTE,
+    store=_store,
+)
+
+llm_slots = ConcurrencyLimiter("AI", settings.MAX_CONCURRENT_LLM_CALLS)
+
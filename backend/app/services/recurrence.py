@@ -0,0 +1,223 @@
+# Recurrence rules for repeating tasks, expanded lazily into occurrences
+import calendar
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from app.utils.config import settings
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Datetimes in this app are naive UTC; PostgreSQL hands back aware ones"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_until(value: str) -> datetime:
+    match = re.fullmatch(r"(\d{8})(?:T(\d{6})Z?)?", value)
+    if not match:
+        raise ValueError(f"UNTIL must look like 20240131 or 20240131T170000Z, not {value!r}")
+    return datetime.strptime(match.group(1) + (match.group(2) or "235959"), "%Y%m%d%H%M%S")
+
+
+class RecurrenceRule:
+    """
+    The subset of an RFC 5545 RRULE that tasks support: FREQ, INTERVAL,
+    BYDAY (weekly rules), BYMONTHDAY (monthly rules, negative counts from
+    the end of the month), and COUNT or UNTIL. Occurrences keep the time of
+    day of the series start.
+    """
+    __slots__ = ("freq", "interval", "by_day", "by_month_day", "count", "until")
+
+    def __init__(
+        self,
+        freq: str,
+        interval: int = 1,
+        by_day: Tuple[int, ...] = (),
+        by_month_day: Optional[int] = None,
+        count: Optional[int] = None,
+        until: Optional[datetime] = None,
+    ):
+        self.freq = freq
+        self.interval = interval
+        self.by_day = by_day
+        self.by_month_day = by_month_day
+        self.count = count
+        self.until = until
+
+    def __str__(self):
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.by_day:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in self.by_day))
+        if self.by_month_day is not None:
+            parts.append(f"BYMONTHDAY={self.by_month_day}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%dT%H%M%S}Z")
+        return ";".join(parts)
+
+
+def parse_rule(text: str) -> RecurrenceRule:
+    """Parse e.g. "FREQ=WEEKLY;BYDAY=MO,TH;COUNT=10"; raises ValueError when invalid"""
+    text = (text or "").strip()
+    if text.upper().startswith("RRULE:"):
+        text = text[6:]
+    parts = {}
+    for part in filter(None, text.split(";")):
+        key, _, value = part.partition("=")
+        key, value = key.strip().upper(), value.strip().upper()
+        if not value:
+            raise ValueError(f"Recurrence part {part!r} has no value")
+        parts[key] = value
+
+    unknown = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL"}
+    if unknown:
+        raise ValueError(f"Unsupported recurrence parts: {', '.join(sorted(unknown))}")
+    freq = parts.get("FREQ")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+
+    try:
+        interval = int(parts.get("INTERVAL", "1"))
+        count = int(parts["COUNT"]) if "COUNT" in parts else None
+        by_month_day = int(parts["BYMONTHDAY"]) if "BYMONTHDAY" in parts else None
+    except ValueError:
+        raise ValueError("INTERVAL, COUNT and BYMONTHDAY must be integers")
+    if interval < 1:
+        raise ValueError("INTERVAL must be at least 1")
+    if count is not None and count < 1:
+        raise ValueError("COUNT must be at least 1")
+    if count is not None and "UNTIL" in parts:
+        raise ValueError("COUNT and UNTIL can't be combined")
+
+    by_day: Tuple[int, ...] = ()
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise ValueError("BYDAY is only supported with FREQ=WEEKLY")
+        days = parts["BYDAY"].split(",")
+        if not set(days) <= set(WEEKDAYS):
+            raise ValueError(f"BYDAY takes weekdays from {','.join(WEEKDAYS)}")
+        by_day = tuple(sorted({WEEKDAYS.index(day) for day in days}))
+    if by_month_day is not None:
+        if freq != "MONTHLY":
+            raise ValueError("BYMONTHDAY is only supported with FREQ=MONTHLY")
+        if not (1 <= abs(by_month_day) <= 31):
+            raise ValueError("BYMONTHDAY must be between 1 and 31, or -31 and -1")
+
+    until = _parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+    return RecurrenceRule(freq, interval, by_day, by_month_day, count, until)
+
+
+def normalize_rule(text: str) -> str:
+    """The canonical form of a rule, so equal rules share cached expansions"""
+    return str(parse_rule(text))
+
+
+def _add_months(start: datetime, months: int) -> Tuple[int, int]:
+    month = start.month - 1 + months
+    return start.year + month // 12, month % 12 + 1
+
+
+def _monthly(rule: RecurrenceRule, dtstart: datetime, first_period: int, end: datetime):
+    """(index within the series or None, occurrence) for monthly and yearly rules"""
+    months_per_period = rule.interval * (12 if rule.freq == "YEARLY" else 1)
+    index = 0
+    period = first_period
+    while True:
+        year, month = _add_months(dtstart, period * months_per_period)
+        if datetime(year, month, 1) >= end:
+            return
+        last_day = calendar.monthrange(year, month)[1]
+        day = rule.by_month_day if rule.by_month_day is not None else dtstart.day
+        if day < 0:
+            day = last_day + 1 + day
+        # Months without the day (e.g. the 31st, or Feb 29) are skipped, as in RFC 5545
+        if 1 <= day <= last_day:
+            occurrence = dtstart.replace(year=year, month=month, day=day)
+            if occurrence >= dtstart:
+                yield index, occurrence
+                index += 1
+        period += 1
+
+
+def _fixed(rule: RecurrenceRule, dtstart: datetime, start: datetime, end: datetime):
+    """(index within the series, occurrence) for daily and weekly rules, starting near `start`"""
+    if rule.freq == "DAILY" or not rule.by_day:
+        step = timedelta(days=rule.interval * (7 if rule.freq == "WEEKLY" else 1))
+        period = max(0, (start - dtstart) // step)
+        while True:
+            occurrence = dtstart + period * step
+            if occurrence >= end:
+                return
+            yield period, occurrence
+            period += 1
+
+    # Weekly on given days: each period is one week, starting on Monday
+    step = timedelta(weeks=rule.interval)
+    week_start = dtstart - timedelta(days=dtstart.weekday())
+    first_week = [day for day in rule.by_day if day >= dtstart.weekday()]
+    period = max(0, (start - week_start) // step)
+    while True:
+        days = first_week if period == 0 else rule.by_day
+        base = 0 if period == 0 else len(first_week) + (period - 1) * len(rule.by_day)
+        period_start = week_start + period * step
+        if period_start >= end:
+            return
+        for position, day in enumerate(days):
+            occurrence = period_start + timedelta(days=day)
+            if occurrence >= end:
+                return
+            yield base + position, occurrence
+        period += 1
+
+
+@lru_cache(maxsize=settings.RECURRENCE_CACHE_SIZE)
+def _expand(rule_text: str, dtstart: datetime, start: datetime, end: datetime, limit: int) -> Tuple[datetime, ...]:
+    rule = parse_rule(rule_text)
+    if rule.freq in ("DAILY", "WEEKLY"):
+        candidates = _fixed(rule, dtstart, start, end)
+    else:
+        # Without COUNT there is no need to number occurrences from the first one
+        first_period = 0
+        if rule.count is None:
+            months_per_period = rule.interval * (12 if rule.freq == "YEARLY" else 1)
+            months = (start.year - dtstart.year) * 12 + start.month - dtstart.month
+            first_period = max(0, months // months_per_period - 1)
+        candidates = _monthly(rule, dtstart, first_period, end)
+
+    found: List[datetime] = []
+    for index, occurrence in candidates:
+        if rule.count is not None and index >= rule.count:
+            break
+        if rule.until is not None and occurrence > rule.until:
+            break
+        if occurrence >= start:
+            found.append(occurrence)
+            if len(found) >= limit:
+                break
+    return tuple(found)
+
+
+def occurrences(rule_text: str, dtstart: datetime, start: datetime, end: datetime) -> Tuple[datetime, ...]:
+    """
+    Occurrences of the rule due in [start, end), at most
+    RECURRENCE_MAX_OCCURRENCES of them. Results are cached per rule, series
+    start and window, so repeated calendar views don't expand rules again.
+    """
+    dtstart, start, end = naive_utc(dtstart), naive_utc(start), naive_utc(end)
+    if end <= start:
+        return ()
+    return _expand(rule_text, dtstart, start, end, settings.RECURRENCE_MAX_OCCURRENCES)
+
+
+def is_occurrence(rule_text: str, dtstart: datetime, when: datetime) -> bool:
+    when = naive_utc(when)
+    return when in occurrences(rule_text, dtstart, when, when + timedelta(microseconds=1))
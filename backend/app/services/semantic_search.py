@@ -0,0 +1,177 @@
+# Offline semantic search over task titles and descriptions
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.task import Task
+from app.utils.config import settings
+
+# Words that carry no meaning for matching tasks against a query
+STOP_WORDS = frozenset(
+    "a an and are about any anything as at be do does for from have i in is it me "
+    "my of on or related regarding so some something that the this to what with".split()
+)
+
+# At most this many ranked task IDs are returned per query
+MAX_CANDIDATES = 1000
+
+
+def _features(text: str) -> Iterable[Tuple[str, float]]:
+    """Words, word bigrams and character trigrams, so "refactor" still matches "refactoring" """
+    words = [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOP_WORDS]
+    for word in words:
+        yield "w:" + word, 1.0
+        padded = f"<{word}>"
+        trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for trigram in trigrams:
+            yield "c:" + trigram, 1.0 / len(trigrams)
+    for first, second in zip(words, words[1:]):
+        yield f"b:{first} {second}", 0.5
+
+
+def embed(text: str, dimensions: Optional[int] = None) -> np.ndarray:
+    """
+    Embed text with a signed hashing vectorizer into a unit-length float32
+    vector. crc32 is used rather than hash() so vectors are stable across
+    processes and can be stored.
+    """
+    dimensions = dimensions or settings.SEMANTIC_DIMENSIONS
+    vector = np.zeros(dimensions, dtype=np.float32)
+    features = list(_features(text))
+    if not features:
+        return vector
+
+    hashes = np.array([zlib.crc32(name.encode("utf-8")) for name, _ in features], dtype=np.uint32)
+    weights = np.array([weight for _, weight in features], dtype=np.float32)
+    signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, hashes % dimensions, signs * weights)
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def task_text(title: Optional[str], description: Optional[str]) -> str:
+    return f"{title or ''} {description or ''}"
+
+
+def embed_task(title: Optional[str], description: Optional[str]) -> bytes:
+    """Embedding of a task in the compact form stored in tasks.embedding"""
+    return embed(task_text(title, description)).tobytes()
+
+
+class TenantIndex:
+    """Task IDs and their embeddings for one tenant as a contiguous float32 matrix"""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+        self.positions: Dict[int, int] = {}
+        # (row count, latest change) of the tenant's tasks when last synced
+        self.version = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clear(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, self.dimensions), dtype=np.float32)
+        self.positions = {}
+
+    def upsert(self, rows):
+        """Add or replace (id, title, description, embedding) rows"""
+        new_ids, new_vectors = [], []
+        for task_id, title, description, blob in rows:
+            vector = self._vector(title, description, blob)
+            position = self.positions.get(task_id)
+            if position is None:
+                self.positions[task_id] = len(self.ids) + len(new_ids)
+                new_ids.append(task_id)
+                new_vectors.append(vector)
+            else:
+                self.vectors[position] = vector
+        if new_ids:
+            self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+            self.vectors = np.vstack([self.vectors, np.stack(new_vectors)])
+
+    def _vector(self, title, description, blob) -> np.ndarray:
+        # Rows written before embeddings existed, or with another dimension
+        # setting, are embedded on the fly
+        if blob is not None and len(blob) == self.dimensions * 4:
+            return np.frombuffer(blob, dtype=np.float32)
+        return embed(task_text(title, description), self.dimensions)
+
+    def search(self, query: np.ndarray, min_score: float) -> List[int]:
+        """IDs of tasks scoring at least `min_score`, best match first"""
+        if not len(self.ids):
+            return []
+        scores = self.vectors @ query
+        matches = np.flatnonzero(scores >= min_score)
+        if len(matches) > MAX_CANDIDATES:
+            matches = matches[np.argpartition(scores[matches], -MAX_CANDIDATES)[-MAX_CANDIDATES:]]
+        ranked = matches[np.argsort(scores[matches])[::-1]]
+        return self.ids[ranked].tolist()
+
+
+class SemanticIndex:
+    """
+    Per-tenant in-memory embedding indexes, kept in step with the database.
+
+    Before each search one aggregate query compares the tenant's task count
+    and latest change time with what the index last saw. Only tasks changed
+    since then are loaded; a full reload happens only when tasks were
+    deleted or archived. Archived tasks are not indexed.
+    """
+
+    def __init__(self, dimensions: int = 512, min_score: float = 0.15):
+        self.dimensions = dimensions
+        self.min_score = min_score
+        self._tenants: Dict[str, TenantIndex] = {}
+        self._lock = threading.Lock()
+
+    def _tenant(self, tenant_id: str) -> TenantIndex:
+        with self._lock:
+            index = self._tenants.get(tenant_id)
+            if index is None:
+                index = self._tenants[tenant_id] = TenantIndex(self.dimensions)
+            return index
+
+    def sync(self, db: Session, tenant_id: str) -> TenantIndex:
+        index = self._tenant(tenant_id)
+        changed_at = func.coalesce(Task.updated_at, Task.created_at)
+        version = tuple(db.execute(
+            select(func.count(Task.id), func.max(changed_at)).where(Task.tenant_id == tenant_id)
+        ).one())
+
+        with index.lock:
+            if version == index.version:
+                return index
+
+            query = select(Task.id, Task.title, Task.description, Task.embedding).where(Task.tenant_id == tenant_id)
+            if index.version is not None and index.version[1] is not None:
+                # >= rather than > because timestamps can tie
+                index.upsert(db.execute(query.where(changed_at >= index.version[1])).all())
+            if len(index) != version[0]:
+                index.clear()
+                index.upsert(db.execute(query).all())
+            index.version = version
+        return index
+
+    def search(self, db: Session, tenant_id: str, query: str) -> List[int]:
+        """Ranked IDs of the tenant's tasks that match the query"""
+        index = self.sync(db, tenant_id)
+        query_vector = embed(query, self.dimensions)
+        with index.lock:
+            return index.search(query_vector, self.min_score)
+
+
+semantic_index = SemanticIndex(
+    dimensions=settings.SEMANTIC_DIMENSIONS,
+    min_score=settings.SEMANTIC_MIN_SCORE,
+)
@@ -1,45 +1,348 @@
-from sqlalchemy.orm import Session
-from app.models.task import Task
+from functools import wraps
+from types import SimpleNamespace
+import heapq
+import inspect
+from sqlalchemy import insert, select, union_all
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, undefer
+from app.db.partitions import ensure_tenant_partition
+from app.db.session import replica_pool
+from app.models.task import DEFAULT_TENANT, ArchivedTask, Task
+from app.services.archive import ARCHIVE_COLUMNS
+from app.services.outbox import record_event
+from app.services.dedupe import ESTIMATE_SLACK, duplicate_index, find_duplicate_groups, title_similarity
+from app.services.recurrence import is_occurrence, naive_utc, occurrences
+from app.services.semantic_search import embed_task, semantic_index
 from app.schemas.task import TaskCreate, TaskUpdate, TaskFilter
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+from app.utils.config import settings
+
+# Columns returned by the lightweight list path, in TaskResponse field order
+RESPONSE_FIELDS = (
+    "id", "title", "description", "completed", "priority",
+    "category", "created_at", "updated_at", "due_date",
+    "recurrence", "recurrence_id", "occurrence_date",
+)
+RESPONSE_COLUMNS = tuple(getattr(Task, name) for name in RESPONSE_FIELDS)
+
+PRIORITY_RANK = {"low": 0, "medium": 1, "high": 2}
+# Fields merged_fields() reads from a duplicate
+MERGED_FIELDS = ("description", "category", "due_date", "priority")
+
+def merged_fields(task: Task, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Changes that fold a duplicate's values into `task`: fill its blanks and keep the higher priority"""
+    changes = {}
+    for field in ("description", "category", "due_date"):
+        if getattr(task, field) in (None, "") and values.get(field) not in (None, ""):
+            changes[field] = values[field]
+    priority = values.get("priority")
+    if PRIORITY_RANK.get(priority, -1) > PRIORITY_RANK.get(task.priority, -1):
+        changes["priority"] = priority
+    return changes
+
+def read_only(method):
+    """
+    Run a service method with replica reads allowed (see RoutingSession).
+    If the chosen replica turns out to be unreachable, the read is retried
+    once on the primary.
+    """
+    if inspect.isgeneratorfunction(method):
+        @wraps(method)
+        def generator_wrapper(self, *args, **kwargs):
+            previous = self.db.info.get("read_only", False)
+            self.db.info["read_only"] = True
+            try:
+                yield from method(self, *args, **kwargs)
+            finally:
+                self.db.info["read_only"] = previous
+        return generator_wrapper
+    
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        previous = self.db.info.get("read_only", False)
+        self.db.info["read_only"] = True
+        try:
+            return method(self, *args, **kwargs)
+        except OperationalError:
+            if replica_pool is None or self.db.info.get("use_primary"):
+                raise
+            self.db.rollback()
+            self.db.info["read_only"] = False
+            return method(self, *args, **kwargs)
+        finally:
+            self.db.info["read_only"] = previous
+    return wrapper
+
+def writes(method):
+    """Pin the session to the primary before a write, including its lookups"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.db.info["use_primary"] = True
+        return method(self, *args, **kwargs)
+    return wrapper
 
 class TaskService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, tenant_id: str = DEFAULT_TENANT):
         self.db = db
+        self.tenant_id = tenant_id
     
+    @writes
     def create_task(self, task_data: TaskCreate) -> Task:
         """Create a new task"""
-        db_task = Task(**task_data.model_dump())
+        ensure_tenant_partition(self.tenant_id)
+        db_task = Task(**task_data.model_dump(), tenant_id=self.tenant_id)
+        db_task.embedding = embed_task(task_data.title, task_data.description)
         self.db.add(db_task)
+        self.db.flush()
+        record_event(self.db, self.tenant_id, "task_created", task=db_task.to_dict())
         self.db.commit()
         self.db.refresh(db_task)
+        if db_task.recurrence is None:
+            duplicate_index.add(self.tenant_id, db_task.id, db_task.title)
         return db_task
     
-    def get_task(self, task_id: int) -> Optional[Task]:
-        """Get a task by ID"""
-        return self.db.query(Task).filter(Task.id == task_id).first()
+    @read_only
+    def find_duplicate(self, title: str) -> Optional[Task]:
+        """Return an open task whose title is a near-duplicate of `title`"""
+        # Only the few LSH candidates are checked, never the whole table
+        for task_id, _ in duplicate_index.candidates(
+            self.db, self.tenant_id, title, settings.DEDUPE_THRESHOLD - ESTIMATE_SLACK
+        )[:5]:
+            task = self.get_task(task_id)
+            if task is None or task.completed or task.recurrence is not None:
+                # Changed by another worker since it was indexed
+                duplicate_index.remove(self.tenant_id, task_id)
+                continue
+            if title_similarity(task.title, title) >= settings.DEDUPE_THRESHOLD:
+                return task
+        return None
     
-    def get_tasks(self, filters: Optional[TaskFilter] = None, skip: int = 0, limit: int = 100) -> List[Task]:
-        """Get all tasks with optional filtering"""
-        query = self.db.query(Task)
-        
+    def create_or_merge_task(self, task_data: TaskCreate, on_duplicate: Optional[str] = None) -> Tuple[Task, Optional[Task]]:
+        """
+        Create a task, applying the duplicate policy ("allow", "warn" or
+        "merge"; DEDUPE_POLICY by default). Returns the resulting task and
+        the near-duplicate that was found, if any. Under "merge" the two are
+        the same task and nothing new is created.
+        """
+        policy = on_duplicate or settings.DEDUPE_POLICY
+        # Repeating tasks are never merged into, or with, one-off tasks
+        check = policy != "allow" and task_data.recurrence is None
+        duplicate = self.find_duplicate(task_data.title) if check else None
+        if duplicate is not None and policy == "merge":
+            changes = merged_fields(duplicate, task_data.model_dump())
+            if changes:
+                duplicate = self.update_task(duplicate.id, TaskUpdate(**changes))
+            return duplicate, duplicate
+        return self.create_task(task_data), duplicate
+    
+    @read_only
+    def get_task(self, task_id: int, include_archived: bool = False) -> Optional[Task]:
+        """Get a task by ID, optionally falling back to the archive"""
+        task = self._query().filter(Task.id == task_id).first()
+        if task is None and include_archived:
+            task = self._query(model=ArchivedTask).filter(ArchivedTask.id == task_id).first()
+        return task
+    
+    def _apply_filters(self, query, filters: Optional[TaskFilter], model=Task):
+        """Scope an ORM query or select() to the tenant and apply optional filters"""
+        query = query.where(model.tenant_id == self.tenant_id)
         if filters:
             if filters.completed is not None:
-                query = query.filter(Task.completed == filters.completed)
+                query = query.where(model.completed == filters.completed)
             if filters.priority:
-                query = query.filter(Task.priority == filters.priority)
+                query = query.where(model.priority == filters.priority)
             if filters.category:
-                query = query.filter(Task.category == filters.category)
+                query = query.where(model.category == filters.category)
             if filters.search:
                 search_pattern = f"%{filters.search}%"
-                query = query.filter(
-                    Task.title.ilike(search_pattern) | 
-                    Task.description.ilike(search_pattern)
+                query = query.where(
+                    model.title.ilike(search_pattern) | 
+                    model.description.ilike(search_pattern)
+                )
+            window = self._window(filters)
+            if window is not None:
+                # Repeating tasks show up as their occurrences instead (see get_tasks)
+                query = query.where(
+                    model.due_date >= window[0],
+                    model.due_date < window[1],
+                    model.recurrence.is_(None)
+                )
+        return query
+    
+    def _window(self, filters: Optional[TaskFilter]) -> Optional[Tuple[datetime, datetime]]:
+        """The requested due-date window; a missing bound is one year from the other"""
+        if not filters or (filters.due_after is None and filters.due_before is None):
+            return None
+        start, end = naive_utc(filters.due_after), naive_utc(filters.due_before)
+        if start is None:
+            start = end - timedelta(days=366)
+        if end is None:
+            end = start + timedelta(days=366)
+        return start, end
+    
+    def _query(self, filters: Optional[TaskFilter] = None, model=Task):
+        """ORM query over this tenant's tasks (or its archived tasks)"""
+        return self._apply_filters(self.db.query(model), filters, model)
+    
+    def _include_archived(self, filters: Optional[TaskFilter]) -> bool:
+        # Archived tasks are all completed, so completed=False never needs them
+        return bool(filters and filters.include_archived and filters.completed is not False)
+    
+    @read_only
+    def get_tasks(self, filters: Optional[TaskFilter] = None, skip: int = 0, limit: int = 100) -> List[Task]:
+        """
+        Get all tasks with optional filtering. With a due-date window, tasks
+        are ordered by due date and repeating tasks are expanded into their
+        occurrences in the window.
+        """
+        window = self._window(filters)
+        if window is not None:
+            return self._get_tasks_in_window(filters, window, skip, limit)
+        
+        # id breaks ties between tasks created in the same second, so pages
+        # neither repeat nor skip rows
+        query = self._query(filters).order_by(Task.created_at.desc(), Task.id.desc())
+        if not self._include_archived(filters):
+            return query.offset(skip).limit(limit).all()
+        
+        # Each side can contribute at most skip + limit rows to the page
+        archived = self._query(filters, ArchivedTask).order_by(ArchivedTask.created_at.desc(), ArchivedTask.id.desc())
+        merged = heapq.merge(
+            query.limit(skip + limit).all(),
+            archived.limit(skip + limit).all(),
+            key=lambda task: (task.created_at, task.id),
+            reverse=True
+        )
+        return list(merged)[skip:skip + limit]
+    
+    def _get_tasks_in_window(self, filters: TaskFilter, window: Tuple[datetime, datetime], skip: int, limit: int) -> List[Task]:
+        # Stored rows include occurrences that were completed or edited
+        sources = [self._query(filters).order_by(Task.due_date.asc()).limit(skip + limit).all()]
+        if self._include_archived(filters):
+            sources.append(
+                self._query(filters, ArchivedTask).order_by(ArchivedTask.due_date.asc()).limit(skip + limit).all()
+            )
+        sources.append(self._occurrences(filters, *window)[:skip + limit])
+        merged = heapq.merge(*sources, key=lambda task: naive_utc(task.due_date))
+        return list(merged)[skip:skip + limit]
+    
+    @staticmethod
+    def _series_start(task: Task) -> datetime:
+        return task.due_date or task.created_at
+    
+    def _occurrences(self, filters: Optional[TaskFilter], start: datetime, end: datetime) -> List[Task]:
+        """
+        Occurrences of the tenant's repeating tasks due in [start, end) that
+        are not stored as rows, as unsaved Task objects ordered by due date.
+        They carry the id of their repeating task in both id and recurrence_id.
+        """
+        if filters and filters.completed:
+            # Only occurrences that were never completed are left unstored
+            return []
+        if filters:
+            filters = filters.model_copy(update={"due_after": None, "due_before": None})
+        series = self._query(filters).filter(Task.recurrence.isnot(None), Task.completed == False).all()
+        due = {}
+        for task in series:
+            dates = occurrences(task.recurrence, self._series_start(task), start, end)
+            if dates:
+                due[task.id] = dates
+        if not due:
+            return []
+        
+        stored = {
+            (recurrence_id, naive_utc(occurrence_date))
+            for recurrence_id, occurrence_date in self.db.execute(
+                select(Task.recurrence_id, Task.occurrence_date).where(
+                    Task.tenant_id == self.tenant_id,
+                    Task.recurrence_id.in_(list(due)),
+                    Task.occurrence_date >= start,
+                    Task.occurrence_date < end
                 )
+            )
+        }
+        found = [
+            Task(
+                id=task.id,
+                tenant_id=task.tenant_id,
+                title=task.title,
+                description=task.description,
+                completed=False,
+                priority=task.priority,
+                category=task.category,
+                created_at=task.created_at,
+                updated_at=task.updated_at,
+                due_date=when,
+                recurrence_id=task.id,
+                occurrence_date=when
+            )
+            for task in series if task.id in due
+            for when in due[task.id] if (task.id, when) not in stored
+        ]
+        found.sort(key=lambda task: task.due_date)
+        return found
+    
+    @read_only
+    def get_task_rows(self, filters: Optional[TaskFilter] = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get a page of tasks as plain dicts, skipping ORM entity construction"""
+        query = self._apply_filters(select(*RESPONSE_COLUMNS), filters)
+        if self._include_archived(filters):
+            archived = self._apply_filters(
+                select(*(getattr(ArchivedTask, name) for name in RESPONSE_FIELDS)), filters, ArchivedTask
+            )
+            rows = union_all(query, archived).subquery()
+            query = select(rows).order_by(rows.c.created_at.desc(), rows.c.id.desc())
+        else:
+            query = query.order_by(Task.created_at.desc(), Task.id.desc())
+        query = query.offset(skip).limit(limit)
+        return [dict(row) for row in self.db.execute(query).mappings()]
+    
+    @read_only
+    def semantic_search(self, text: str, filters: Optional[TaskFilter] = None, skip: int = 0, limit: int = 100) -> List[Task]:
+        """Get active tasks ranked by similarity to `text`, best match first"""
+        ranked = semantic_index.search(self.db, self.tenant_id, text)
+        if not ranked:
+            return []
+        if not (filters and (filters.completed is not None or filters.priority or filters.category or filters.search)):
+            # Nothing else filters the candidates, so only this page is needed
+            ranked = ranked[skip:skip + limit]
+            skip = 0
         
-        return query.order_by(Task.created_at.desc()).offset(skip).limit(limit).all()
+        tasks = self._query(filters).filter(Task.id.in_(ranked)).all()
+        rank = {task_id: position for position, task_id in enumerate(ranked)}
+        tasks.sort(key=lambda task: rank[task.id])
+        return tasks[skip:skip + limit]
     
+    @read_only
+    def iter_tasks(self, filters: Optional[TaskFilter] = None, batch_size: int = 1000) -> Iterator[Task]:
+        """Stream all matching tasks using a server-side cursor"""
+        query = self._query(filters)
+        
+        # stream_results keeps the result set on the server and yield_per
+        # bounds how many ORM objects are buffered at any time.
+        query = query.order_by(Task.id).execution_options(stream_results=True).yield_per(batch_size)
+        for task in query:
+            yield task
+            # Release the row from the identity map so memory stays flat
+            self.db.expunge(task)
+    
+    @writes
+    def bulk_create_tasks(self, tasks: Iterable[dict]) -> int:
+        """Insert a batch of validated task rows with a single executemany"""
+        rows = [
+            dict(row, tenant_id=self.tenant_id, embedding=embed_task(row.get("title"), row.get("description")))
+            for row in tasks
+        ]
+        if not rows:
+            return 0
+        ensure_tenant_partition(self.tenant_id)
+        self.db.execute(insert(Task), rows)
+        record_event(self.db, self.tenant_id, "tasks_imported", count=len(rows))
+        self.db.commit()
+        return len(rows)
+    
+    @writes
     def update_task(self, task_id: int, task_data: TaskUpdate) -> Optional[Task]:
         """Update a task"""
         db_task = self.get_task(task_id)
@@ -47,24 +350,162 @@ class TaskService:
             return None
         
         update_data = task_data.model_dump(exclude_unset=True)
+        if "completed" in update_data and update_data["completed"] != db_task.completed:
+            # completed_at is what the archiver ages tasks by
+            db_task.completed_at = datetime.utcnow() if update_data["completed"] else None
         for field, value in update_data.items():
             setattr(db_task, field, value)
+        if "title" in update_data or "description" in update_data:
+            db_task.embedding = embed_task(db_task.title, db_task.description)
         
         db_task.updated_at = datetime.utcnow()
+        record_event(self.db, self.tenant_id, "task_updated", task=db_task.to_dict())
         self.db.commit()
         self.db.refresh(db_task)
+        if db_task.completed or db_task.recurrence is not None:
+            duplicate_index.remove(self.tenant_id, db_task.id)
+        elif db_task.recurrence_id is None and ("title" in update_data or "completed" in update_data or "recurrence" in update_data):
+            duplicate_index.add(self.tenant_id, db_task.id, db_task.title)
         return db_task
     
+    def _stored_occurrence(self, task_id: int, occurrence_date: datetime) -> Optional[Task]:
+        return self._query().filter(Task.recurrence_id == task_id, Task.occurrence_date == occurrence_date).first()
+    
+    @writes
+    def update_occurrence(self, task_id: int, occurrence_date: datetime, task_data: TaskUpdate) -> Optional[Task]:
+        """
+        Complete or edit one occurrence of a repeating task. The first change
+        stores the occurrence as a task of its own; later ones update that
+        row. Returns None if the task doesn't exist or doesn't repeat, and
+        raises ValueError if the date is not one of its occurrences.
+        """
+        series = self.get_task(task_id)
+        if series is None or not series.recurrence:
+            return None
+        occurrence_date = naive_utc(occurrence_date)
+        if not is_occurrence(series.recurrence, self._series_start(series), occurrence_date):
+            raise ValueError(f"{occurrence_date.isoformat()} is not an occurrence of task {task_id}")
+        
+        stored = self._stored_occurrence(task_id, occurrence_date)
+        if stored is not None:
+            return self.update_task(stored.id, task_data)
+        
+        occurrence = Task(
+            tenant_id=self.tenant_id,
+            title=series.title,
+            description=series.description,
+            completed=False,
+            priority=series.priority,
+            category=series.category,
+            due_date=occurrence_date,
+            recurrence_id=series.id,
+            occurrence_date=occurrence_date
+        )
+        for field, value in task_data.model_dump(exclude_unset=True).items():
+            # An occurrence doesn't repeat on its own
+            if field != "recurrence":
+                setattr(occurrence, field, value)
+        if occurrence.completed:
+            occurrence.completed_at = datetime.utcnow()
+        occurrence.embedding = embed_task(occurrence.title, occurrence.description)
+        self.db.add(occurrence)
+        try:
+            self.db.flush()
+        except IntegrityError:
+            # Stored by a concurrent request; apply this change on top
+            self.db.rollback()
+            return self.update_task(self._stored_occurrence(task_id, occurrence_date).id, task_data)
+        record_event(self.db, self.tenant_id, "task_created", task=occurrence.to_dict())
+        self.db.commit()
+        self.db.refresh(occurrence)
+        return occurrence
+    
+    @writes
     def delete_task(self, task_id: int) -> bool:
         """Delete a task"""
         db_task = self.get_task(task_id)
         if not db_task:
             return False
         
+        if db_task.recurrence:
+            # Stored occurrences go with their repeating task
+            for occurrence in self._query().filter(Task.recurrence_id == task_id).all():
+                self.db.delete(occurrence)
+                record_event(self.db, self.tenant_id, "task_deleted", task_id=occurrence.id)
         self.db.delete(db_task)
+        record_event(self.db, self.tenant_id, "task_deleted", task_id=task_id)
         self.db.commit()
+        duplicate_index.remove(self.tenant_id, task_id)
         return True
     
+    @writes
+    def dedupe_tasks(self, dry_run: bool = True) -> Dict[str, Any]:
+        """
+        Find groups of open tasks with near-duplicate titles. Unless
+        `dry_run`, each group is merged into its oldest task and the rest
+        are deleted.
+        """
+        # Repeating tasks and their stored occurrences share a title by design
+        titles = self.db.execute(
+            self._apply_filters(select(Task.id, Task.title), TaskFilter(completed=False))
+            .where(Task.recurrence.is_(None), Task.recurrence_id.is_(None))
+            .order_by(Task.id)
+        ).all()
+        groups = find_duplicate_groups([tuple(row) for row in titles], settings.DEDUPE_THRESHOLD)
+        result = {
+            "groups": [{"keep": group[0], "duplicates": group[1:]} for group in groups],
+            "updated": [],
+            "removed": []
+        }
+        if dry_run or not groups:
+            return result
+        
+        for group in groups:
+            keep = self._query().filter(Task.id == group[0]).one()
+            duplicates = self._query().filter(Task.id.in_(group[1:])).order_by(Task.id).all()
+            # Fold the duplicates in one at a time, so the first to fill a
+            # blank wins, then apply the result as a single update_task call
+            merged = SimpleNamespace(**{name: getattr(keep, name) for name in MERGED_FIELDS})
+            changes = {}
+            for duplicate in duplicates:
+                values = {name: getattr(duplicate, name) for name in MERGED_FIELDS}
+                for field, value in merged_fields(merged, values).items():
+                    setattr(merged, field, value)
+                    changes[field] = value
+            if changes:
+                # update_task re-embeds the task and records the event
+                self.update_task(keep.id, TaskUpdate(**changes))
+                result["updated"].append(keep.id)
+            # delete_task keeps the duplicate index in step
+            for duplicate in duplicates:
+                self.delete_task(duplicate.id)
+                result["removed"].append(duplicate.id)
+        return result
+    
+    @writes
+    def restore_task(self, task_id: int) -> Optional[Task]:
+        """Move an archived task back into the live tasks table"""
+        archived = (
+            self._query(model=ArchivedTask)
+            .options(undefer(ArchivedTask.embedding))
+            .filter(ArchivedTask.id == task_id)
+            .first()
+        )
+        if not archived:
+            return None
+        
+        ensure_tenant_partition(self.tenant_id)
+        # The original id is kept so existing links to the task keep working.
+        # completed_at is reset so the archiver doesn't move it straight back.
+        values = {name: getattr(archived, name) for name in ARCHIVE_COLUMNS}
+        values["completed_at"] = datetime.utcnow()
+        self.db.execute(insert(Task), [values])
+        self.db.delete(archived)
+        restored = self.get_task(task_id)
+        record_event(self.db, self.tenant_id, "task_created", task=restored.to_dict())
+        self.db.commit()
+        return restored
+    
     def mark_task_complete(self, task_id: int) -> Optional[Task]:
         """Mark a task as complete"""
         return self.update_task(task_id, TaskUpdate(completed=True))
@@ -73,18 +514,35 @@ class TaskService:
         """Mark a task as incomplete"""
         return self.update_task(task_id, TaskUpdate(completed=False))
     
+    @read_only
     def get_tasks_by_priority(self, priority: str) -> List[Task]:
         """Get tasks by priority"""
-        return self.db.query(Task).filter(Task.priority == priority).order_by(Task.created_at.desc()).all()
+        return self._query().filter(Task.priority == priority).order_by(Task.created_at.desc()).all()
     
+    @read_only
     def get_tasks_by_category(self, category: str) -> List[Task]:
         """Get tasks by category"""
-        return self.db.query(Task).filter(Task.category == category).order_by(Task.created_at.desc()).all()
+        return self._query().filter(Task.category == category).order_by(Task.created_at.desc()).all()
     
+    @read_only
     def get_overdue_tasks(self) -> List[Task]:
-        """Get overdue tasks"""
+        """
+        Get overdue tasks, including missed occurrences of repeating tasks
+        from the last RECURRENCE_OVERDUE_DAYS days
+        """
         now = datetime.utcnow()
-        return self.db.query(Task).filter(
+        stored = self._query().filter(
             Task.due_date < now,
-            Task.completed == False
-        ).order_by(Task.due_date.asc()).all()
\ No newline at end of file
+            Task.completed == False,
+            Task.recurrence.is_(None)
+        ).order_by(Task.due_date.asc()).all()
+        
+        # Whole-day bounds keep the window, and so its cached expansion, the same all day
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        missed = [
+            task for task in self._occurrences(
+                None, today - timedelta(days=settings.RECURRENCE_OVERDUE_DAYS), today + timedelta(days=1)
+            )
+            if task.due_date < now
+        ]
+        return list(heapq.merge(stored, missed, key=lambda task: naive_utc(task.due_date)))
\ No newline at end of file
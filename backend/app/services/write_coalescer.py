@@ -0,0 +1,132 @@
+# Coalesces bursts of updates to the same task into a single write
+import asyncio
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.db.session import SessionLocal
+from app.schemas.task import TaskUpdate
+from app.services.tasks import TaskService
+
+# "wait": each request returns once its merged update is committed.
+# "async": requests return immediately and the update is committed later,
+# so a crash inside the window loses it.
+DURABILITY_MODES = ("wait", "async")
+
+Key = Tuple[str, int]
+
+
+class PendingUpdate:
+    __slots__ = ("fields", "future", "handle")
+
+    def __init__(self, future: asyncio.Future):
+        self.fields: Dict[str, Any] = {}
+        self.future = future
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class WriteCoalescer:
+    """
+    Buffers task updates per (tenant, task ID) for `window` seconds after the
+    first one arrives, merges their fields (later values win) and commits
+    them with one update_task call, which records a single task_updated
+    event for the whole burst.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._pending: Dict[Key, PendingUpdate] = {}
+        # The event loop only holds weak references to tasks, so flushes
+        # started by the window timer are kept here until they finish
+        self._flushing: Set[asyncio.Task] = set()
+        # Per-key lock and the number of flushes using it. Flushes of a task
+        # run one at a time, so an older write never lands after a newer one.
+        self._locks: Dict[Key, Tuple[asyncio.Lock, int]] = {}
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def add(self, tenant_id: str, task_id: int, fields: Dict[str, Any]) -> asyncio.Future:
+        """
+        Queue an update. The returned future resolves to the task as committed,
+        or None if it no longer exists; await it through asyncio.shield so one
+        cancelled request can't cancel the result shared with others.
+        """
+        key = (tenant_id, task_id)
+        pending = self._pending.get(key)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = self._pending[key] = PendingUpdate(loop.create_future())
+            pending.handle = loop.call_later(self.window, self._start_flush, tenant_id, task_id)
+        pending.fields.update(fields)
+        return pending.future
+
+    def pending_fields(self, tenant_id: str, task_id: int) -> Dict[str, Any]:
+        """Fields buffered for the task and not yet committed"""
+        pending = self._pending.get((tenant_id, task_id))
+        return dict(pending.fields) if pending is not None else {}
+
+    async def flush(self, tenant_id: str, task_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Commit any buffered update for the task now, after any flush of it
+        already in progress; returns the task or None
+        """
+        key = (tenant_id, task_id)
+        lock, users = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                return await self._flush_pending(key)
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    async def _flush_pending(self, key: Key) -> Optional[Dict[str, Any]]:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return None
+        pending.handle.cancel()
+
+        try:
+            task = await run_in_threadpool(self._write, *key, pending.fields)
+        except Exception as e:
+            pending.future.set_exception(e)
+            # Mark it retrieved; in async mode nobody awaits the future
+            pending.future.exception()
+            raise
+
+        pending.future.set_result(task)
+        return task
+
+    def _start_flush(self, tenant_id: str, task_id: int):
+        task = asyncio.ensure_future(self._flush_quietly(tenant_id, task_id))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush_quietly(self, tenant_id: str, task_id: int):
+        try:
+            await self.flush(tenant_id, task_id)
+        except Exception as e:
+            print(f"Warning: Coalesced update of task {task_id} failed: {e}")
+
+    async def flush_all(self, tenant_id: Optional[str] = None):
+        """Commit every buffered update, e.g. on shutdown"""
+        for key in list(self._pending):
+            if tenant_id is None or key[0] == tenant_id:
+                await self._flush_quietly(*key)
+        if tenant_id is None and self._flushing:
+            # Let flushes the window timer already started finish too
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def _write(self, tenant_id: str, task_id: int, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            task = TaskService(db, tenant_id=tenant_id).update_task(task_id, TaskUpdate(**fields))
+            return task.to_dict() if task is not None else None
+        finally:
+            db.close()
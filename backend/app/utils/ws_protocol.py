@@ -0,0 +1,170 @@
+"""
+WebSocket wire formats, negotiated with the Sec-WebSocket-Protocol header.
+
+- no subprotocol / "taskmgr.json.v1": JSON text frames as documented in the README
+- "taskmgr.msgpack.v2": MessagePack binary frames with the compact keys in
+  COMPACT_KEYS_V2 and the fields in TIMESTAMP_KEYS_V2 as integer
+  milliseconds since the epoch (UTC)
+- "taskmgr.msgpack.v1": the same with the older COMPACT_KEYS_V1 and
+  TIMESTAMP_KEYS_V1 tables
+
+A version's key table never changes once released; a new table means a new
+subprotocol name, so older clients keep working while they upgrade. Keys
+missing from the table are sent as they are.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, List, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+JSON_V1 = "taskmgr.json.v1"
+MSGPACK_V1 = "taskmgr.msgpack.v1"
+MSGPACK_V2 = "taskmgr.msgpack.v2"
+
+Frame = Union[str, bytes]
+
+COMPACT_KEYS_V1 = {
+    # Message envelope
+    "type": "t",
+    "seq": "s",
+    "timestamp": "ts",
+    "events": "ev",
+    "message": "m",
+    "response": "r",
+    "error": "er",
+    "retry_after": "ra",
+    "tasks_updated": "tu",
+    "task_data": "td",
+    "data": "da",
+    "task": "k",
+    "tasks": "ks",
+    "task_id": "ki",
+    "task_ids": "kis",
+    "count": "n",
+    # Task fields
+    "id": "id",
+    "title": "ti",
+    "description": "de",
+    "completed": "co",
+    "priority": "pr",
+    "category": "cg",
+    "created_at": "ca",
+    "updated_at": "ua",
+    "due_date": "dd",
+    "completed_at": "ct",
+}
+# v2 adds the recurring task fields
+COMPACT_KEYS_V2 = {
+    **COMPACT_KEYS_V1,
+    "recurrence": "rr",
+    "recurrence_id": "ri",
+    "occurrence_date": "od",
+}
+
+# Fields holding timestamps, sent as epoch milliseconds
+TIMESTAMP_KEYS_V1 = frozenset(("timestamp", "created_at", "updated_at", "due_date", "completed_at"))
+TIMESTAMP_KEYS_V2 = TIMESTAMP_KEYS_V1 | {"occurrence_date"}
+
+
+def _to_epoch_ms(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        # Naive datetimes in this app are UTC
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    return value
+
+
+def _from_epoch_ms(value: Any) -> Any:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None).isoformat()
+    return value
+
+
+def compact(data: Any, keys: Dict[str, str], timestamps: FrozenSet[str]) -> Any:
+    """Rename keys to their compact form and turn timestamps into epoch milliseconds"""
+    if isinstance(data, dict):
+        return {
+            keys.get(key, key): _to_epoch_ms(value) if key in timestamps else compact(value, keys, timestamps)
+            for key, value in data.items()
+        }
+    if isinstance(data, list):
+        return [compact(item, keys, timestamps) for item in data]
+    return data
+
+
+def expand(data: Any, full_keys: Dict[str, str], timestamps: FrozenSet[str]) -> Any:
+    """Inverse of compact() given the reversed key table, with timestamps back as ISO strings"""
+    if isinstance(data, dict):
+        expanded = {}
+        for key, value in data.items():
+            key = full_keys.get(key, key)
+            expanded[key] = _from_epoch_ms(value) if key in timestamps else expand(value, full_keys, timestamps)
+        return expanded
+    if isinstance(data, list):
+        return [expand(item, full_keys, timestamps) for item in data]
+    return data
+
+
+class JsonProtocol:
+    name = JSON_V1
+
+    def encode(self, data: Dict[str, Any]) -> Frame:
+        return json.dumps(data, default=str)
+
+    def encode_json(self, text: str) -> Frame:
+        # Messages that are already JSON (e.g. outbox events) go out as they are
+        return text
+
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        return json.loads(frame)
+
+
+class MsgpackProtocol:
+    def __init__(self, name: str, keys: Dict[str, str], timestamps: FrozenSet[str]):
+        self.name = name
+        self.keys = keys
+        self.full_keys = {compact: full for full, compact in keys.items()}
+        self.timestamps = timestamps
+
+    def encode(self, data: Dict[str, Any]) -> Frame:
+        return msgpack.packb(compact(data, self.keys, self.timestamps), default=str)
+
+    def encode_json(self, text: str) -> Frame:
+        return self.encode(json.loads(text))
+
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        if isinstance(frame, str):
+            # Tolerate text frames, e.g. from hand-written debugging clients
+            return json.loads(frame)
+        return expand(msgpack.unpackb(frame, raw=False), self.full_keys, self.timestamps)
+
+
+JSON_PROTOCOL = JsonProtocol()
+
+# Supported subprotocols; MessagePack is offered only when msgpack is installed
+PROTOCOLS = {JSON_V1: JSON_PROTOCOL}
+if msgpack is not None:
+    PROTOCOLS[MSGPACK_V2] = MsgpackProtocol(MSGPACK_V2, COMPACT_KEYS_V2, TIMESTAMP_KEYS_V2)
+    PROTOCOLS[MSGPACK_V1] = MsgpackProtocol(MSGPACK_V1, COMPACT_KEYS_V1, TIMESTAMP_KEYS_V1)
+
+
+def negotiate(offered: List[str]):
+    """
+    Pick the first offered subprotocol this server supports. Returns the
+    name to accept with (None if the client offered nothing usable) and the
+    protocol to speak, JSON by default.
+    """
+    for name in offered:
+        if name in PROTOCOLS:
+            return name, PROTOCOLS[name]
+    return None, JSON_PROTOCOL
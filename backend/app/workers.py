@@ -0,0 +1,17 @@
+from uvicorn.workers import UvicornWorker
+
+class ProductionUvicornWorker(UvicornWorker):
+    """
+    Gunicorn worker for production.
+    
+    Uses uvloop and httptools when they are installed (falling back to
+    asyncio and h11), and bounds uvicorn's graceful shutdown by gunicorn's
+    graceful_timeout. On shutdown uvicorn sends open WebSockets a 1012
+    (service restart) close frame so clients reconnect to another worker.
+    """
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto", "ws": "auto"}
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Leave a little headroom before gunicorn force-kills the worker
+        self.config.timeout_graceful_shutdown = max(1, self.cfg.graceful_timeout - 1)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Measure the cold import cost of the application with `python -X importtime`
+and fail when it exceeds the startup budget.
+
+    python benchmarks/bench_import_time.py [--budget-ms 1500] [--module app.main]
+
+Exits with status 1 when over budget so it can gate CI. The Gemini SDK must
+not appear in the report: it is loaded lazily after startup.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that must stay out of the startup import graph
+FORBIDDEN_PREFIXES = ("google.generativeai",)
+
+
+def measure(module: str, runs: int):
+    """Return (best total ms, per-module cumulative ms) over several cold runs"""
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR), AGENT_WARMUP="False")
+    best_total = None
+    best_modules = {}
+
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            sys.exit(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+        modules = {}
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = int(cumulative) / 1000
+
+        total = modules.get(module, 0.0)
+        if best_total is None or total < best_total:
+            best_total, best_modules = total, modules
+
+    return best_total, best_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total, modules = measure(args.module, args.runs)
+
+    print(f"Slowest imports (cumulative, best of {args.runs}):")
+    for name, ms in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {ms:9.1f}ms  {name}")
+    print(f"\n{args.module}: {total:.1f}ms (budget {args.budget_ms:.0f}ms)")
+
+    failures = []
+    forbidden = [name for name in modules if name.strip().startswith(FORBIDDEN_PREFIXES)]
+    if forbidden:
+        failures.append(f"eagerly imported: {', '.join(sorted(forbidden))}")
+    if total > args.budget_ms:
+        failures.append(f"import time {total:.1f}ms exceeds budget of {args.budget_ms:.0f}ms")
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compare the task list serialization paths at several page sizes.
+
+    orm+pydantic  ORM entities -> TaskResponse.model_validate per row ->
+                  response_model validation -> JSON (previous GET /tasks path)
+    rows+json     column rows -> dicts -> dumps_bytes (current GET /tasks path)
+
+Runs against a throwaway SQLite database:
+
+    python benchmarks/bench_list_serialization.py
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.db.session import SessionLocal, create_tables
+from app.schemas.task import TaskResponse
+from app.services.tasks import TaskService
+from app.utils.serialization import dumps_bytes
+
+PAGE_SIZES = (10, 100, 500, 1000)
+REPEAT = 20
+
+
+def seed(rows: int):
+    db = SessionLocal()
+    TaskService(db).bulk_create_tasks(
+        {
+            "title": f"Task {i}",
+            "description": "Benchmark task description " * 3,
+            "priority": ("low", "medium", "high")[i % 3],
+            "category": "work",
+            "completed": i % 2 == 0,
+        }
+        for i in range(rows)
+    )
+    db.close()
+
+
+def main():
+    create_tables()
+    seed(max(PAGE_SIZES))
+    response_adapter = TypeAdapter(List[TaskResponse])
+
+    print(f"{'page size':>10} {'orm+pydantic':>14} {'rows+json':>12} {'speedup':>8}")
+    for size in PAGE_SIZES:
+        db = SessionLocal()
+        service = TaskService(db)
+
+        def orm_path():
+            tasks = service.get_tasks(limit=size)
+            models = [TaskResponse.model_validate(task) for task in tasks]
+            validated = response_adapter.validate_python(models)
+            response_adapter.dump_json(validated)
+            db.expunge_all()
+
+        def rows_path():
+            dumps_bytes(service.get_task_rows(limit=size))
+
+        orm_time = min(timeit.repeat(orm_path, number=1, repeat=REPEAT))
+        rows_time = min(timeit.repeat(rows_path, number=1, repeat=REPEAT))
+        print(f"{size:>10} {orm_time * 1000:>12.2f}ms {rows_time * 1000:>10.2f}ms {orm_time / rows_time:>7.1f}x")
+        db.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        os.unlink(_db_file.name)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Exercise the resilient LLM client against a local fake provider that
+injects latency and errors, then compare tail latency with and without
+hedged requests.
+
+    python benchmarks/bench_llm_client.py [--calls 200]
+
+Checks the per-attempt deadline, hedging, and the circuit breaker opening,
+recovering through a half-open trial and re-opening when the trial fails.
+Exits with status 1 when any check fails.
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.llm_client import CircuitBreaker, LLMUnavailableError, ResilientLLMClient
+from fake_llm_provider import FakeProvider
+
+FAST = 0.01
+SLOW = 0.25
+
+failures = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def client_for(provider: FakeProvider, **options) -> ResilientLLMClient:
+    options.setdefault("timeout", 2.0)
+    options.setdefault("max_retries", 0)
+    options.setdefault("backoff", 0.0)
+    return ResilientLLMClient(lambda prompt: provider.generate(prompt), **options)
+
+
+def call(client: ResilientLLMClient):
+    """(result or the exception raised, seconds taken)"""
+    start = time.monotonic()
+    try:
+        result = client.generate("ping")
+    except Exception as e:
+        result = e
+    return result, time.monotonic() - start
+
+
+def check_deadline():
+    provider = FakeProvider(latency=1.0)
+    result, elapsed = call(client_for(provider, timeout=0.1))
+    check(
+        "deadline: a slow attempt is abandoned at the timeout",
+        isinstance(result, LLMUnavailableError) and "deadline" in str(result) and elapsed < 0.5,
+        f"{elapsed * 1000:.0f}ms",
+    )
+
+    provider = FakeProvider(latency=lambda n: 1.0 if n == 1 else FAST)
+    result, elapsed = call(client_for(provider, timeout=0.1, max_retries=1))
+    check(
+        "deadline: the retry after a timed-out attempt succeeds",
+        result == "OK" and provider.calls == 2,
+        f"{elapsed * 1000:.0f}ms, {provider.calls} calls",
+    )
+
+
+def check_hedging():
+    provider = FakeProvider(latency=lambda n: 1.0 if n == 1 else FAST)
+    result, elapsed = call(client_for(provider, hedge_after=0.05))
+    check(
+        "hedge: a slow first request is overtaken by the hedge",
+        result == "OK" and provider.calls == 2 and elapsed < 0.5,
+        f"{elapsed * 1000:.0f}ms",
+    )
+
+    provider = FakeProvider(latency=FAST)
+    result, _ = call(client_for(provider, hedge_after=0.05))
+    check("hedge: fast requests are not hedged", result == "OK" and provider.calls == 1, f"{provider.calls} calls")
+
+    provider = FakeProvider(latency=lambda n: 0.1 if n == 1 else FAST, error_rate=1.0)
+    result, elapsed = call(client_for(provider, hedge_after=0.05))
+    check(
+        "hedge: an attempt whose requests all fail reports the error before the deadline",
+        isinstance(result, LLMUnavailableError) and "Injected" in str(result) and elapsed < 0.5,
+        f"{elapsed * 1000:.0f}ms",
+    )
+
+
+def check_breaker():
+    provider = FakeProvider(error_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+    client = client_for(provider, breaker=breaker)
+
+    for _ in range(3):
+        call(client)
+    check("breaker: opens after consecutive failures", breaker.state == CircuitBreaker.OPEN, breaker.state)
+
+    result, elapsed = call(client)
+    check(
+        "breaker: open circuit rejects calls without reaching the provider",
+        isinstance(result, LLMUnavailableError) and "circuit is open" in str(result) and provider.calls == 3,
+        f"{elapsed * 1000:.1f}ms, {provider.calls} calls",
+    )
+    check("breaker: reports unavailable while open", not client.available)
+
+    time.sleep(breaker.reset_timeout + 0.05)
+    check("breaker: available again after the reset timeout", client.available)
+    result, _ = call(client)
+    check(
+        "breaker: a failed half-open trial re-opens it",
+        isinstance(result, LLMUnavailableError) and breaker.state == CircuitBreaker.OPEN and provider.calls == 4,
+        f"{breaker.state}, {provider.calls} calls",
+    )
+
+    time.sleep(breaker.reset_timeout + 0.05)
+    provider.error_rate = 0.0
+    result, _ = call(client)
+    check(
+        "breaker: a successful half-open trial closes it",
+        result == "OK" and breaker.state == CircuitBreaker.CLOSED,
+        breaker.state,
+    )
+
+
+def tail_latency(calls: int):
+    """Latency percentiles when 10% of provider calls are slow"""
+    # Decided per call number so every run sees the same slow calls
+    def latency(n: int) -> float:
+        return SLOW if random.Random(n).random() < 0.1 else FAST
+
+    print(f"\n{'hedge_after':>11} {'p50':>7} {'p95':>7} {'p99':>7} {'provider calls':>15}")
+    for hedge_after in (None, 0.05):
+        provider = FakeProvider(latency=latency)
+        client = client_for(provider, hedge_after=hedge_after)
+        times = sorted(call(client)[1] for _ in range(calls))
+        p50, p95, p99 = (times[min(len(times) - 1, int(len(times) * q))] for q in (0.5, 0.95, 0.99))
+        label = f"{hedge_after * 1000:.0f}ms" if hedge_after else "off"
+        print(
+            f"{label:>11} {p50 * 1000:>5.0f}ms {p95 * 1000:>5.0f}ms {p99 * 1000:>5.0f}ms "
+            f"{provider.calls / calls:>14.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=200, help="calls per tail latency run")
+    args = parser.parse_args()
+
+    check_deadline()
+    check_hedging()
+    check_breaker()
+    tail_latency(args.calls)
+
+    if failures:
+        sys.exit(f"\n{len(failures)} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Compare the WebSocket wire formats on typical task event frames.
+
+    json     taskmgr.json.v1 (and the default without a subprotocol)
+    msgpack  taskmgr.msgpack.v2: compact keys, epoch-millisecond timestamps
+
+Reports frame size, server-side encode time and client-side decode time
+(decoding back to the JSON shape, as the frontend does):
+
+    python benchmarks/bench_ws_protocol.py
+"""
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.ws_protocol import JSON_PROTOCOL, MSGPACK_V2, PROTOCOLS
+
+BATCH_SIZES = (1, 10, 100)
+REPEAT = 200
+
+
+def task(i: int):
+    return {
+        "id": i,
+        "title": f"Review pull request #{i}",
+        "description": "Check the tests and the migration",
+        "completed": i % 2 == 0,
+        "priority": ("low", "medium", "high")[i % 3],
+        "category": "work",
+        "created_at": "2024-01-01T12:00:00.123456",
+        "updated_at": "2024-01-02T08:30:00",
+        "due_date": "2024-01-05T17:00:00",
+    }
+
+
+def frame(size: int) -> str:
+    """A task event, or a batch of them, as the outbox relay sends it"""
+    events = [{"seq": 1000 + i, "type": "task_updated", "task": task(i)} for i in range(size)]
+    if size == 1:
+        return json.dumps(events[0])
+    return json.dumps({"type": "batch", "events": events})
+
+
+def main():
+    msgpack_protocol = PROTOCOLS.get(MSGPACK_V2)
+    if msgpack_protocol is None:
+        sys.exit("msgpack is not installed")
+
+    print(f"{'events':>7} {'json':>8} {'msgpack':>8} {'ratio':>6} {'encode':>9} {'decode json':>12} {'decode msgpack':>15}")
+    for size in BATCH_SIZES:
+        text = frame(size)
+        packed = msgpack_protocol.encode_json(text)
+        encode_time = min(timeit.repeat(lambda: msgpack_protocol.encode_json(text), number=1, repeat=REPEAT))
+        json_decode = min(timeit.repeat(lambda: JSON_PROTOCOL.decode(text), number=1, repeat=REPEAT))
+        msgpack_decode = min(timeit.repeat(lambda: msgpack_protocol.decode(packed), number=1, repeat=REPEAT))
+        print(
+            f"{size:>7} {len(text):>7}B {len(packed):>7}B {len(packed) / len(text):>6.2f} "
+            f"{encode_time * 1e6:>7.0f}us {json_decode * 1e6:>10.0f}us {msgpack_decode * 1e6:>13.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
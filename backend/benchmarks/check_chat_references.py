@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Check how the chat agent resolves task references in completion requests
+("mark the last one as done"), using the rule-based agent against a
+throwaway SQLite database:
+
+    python benchmarks/check_chat_references.py
+
+Exits with status 1 when any check fails.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+# Rule-based replies only, so the checks never reach an LLM
+os.environ["GEMINI_API_KEY"] = ""
+
+from app.db.session import SessionLocal, create_tables
+from app.schemas.task import TaskCreate
+from app.services.conversation import conversation_store
+from app.services.gemini_agent import TaskAgent
+from app.services.tasks import TaskService
+
+failures = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def completed_ids():
+    db = SessionLocal()
+    try:
+        return {task.id for task in TaskService(db).get_tasks() if task.completed}
+    finally:
+        db.close()
+
+
+def reset(titles):
+    """Fresh open tasks with these titles; returns their IDs"""
+    db = SessionLocal()
+    try:
+        service = TaskService(db)
+        for task in service.get_tasks():
+            service.delete_task(task.id)
+        return [service.create_task(TaskCreate(title=title)).id for title in titles]
+    finally:
+        db.close()
+
+
+def complete(agent: TaskAgent, session: str, message: str):
+    """IDs completed by the message, and the agent's reply"""
+    before = completed_ids()
+    result = agent.process_message(message, session_id=session)
+    return completed_ids() - before, result["response"]
+
+
+def main():
+    create_tables()
+    agent = TaskAgent()
+
+    for phrase, index in (("the last one", -1), ("the first one", 0), ("the second task", 1)):
+        reset(["charlie", "bravo", "alpha"])
+        session = f"ordinal-{phrase}"
+        agent.process_message("show my tasks", session_id=session)
+        listing = conversation_store.last_listing(f"default:{session}")
+        done, reply = complete(agent, session, f"mark {phrase} as done")
+        check(f"'{phrase}' completes that task of the last listing", done == {listing[index]}, reply)
+
+    reset(["charlie", "bravo", "alpha"])
+    agent.process_message("show my tasks", session_id="after-completion")
+    listing = conversation_store.last_listing("default:after-completion")
+    complete(agent, "after-completion", "mark the first one as done")
+    done, reply = complete(agent, "after-completion", "mark the second one as done")
+    check("ordinals still count through the listing after a completion", done == {listing[1]}, reply)
+
+    ids = reset(["charlie", "bravo", "alpha"])
+    done, reply = complete(agent, "no-listing", "mark the last one as done")
+    check("an ordinal without a listing asks which task", not done, reply)
+
+    agent.process_message("create a task to review the budget", session_id="anaphora")
+    created = conversation_store.recent_task_ids("default:anaphora")[-1]
+    done, reply = complete(agent, "anaphora", "mark it as done")
+    check("'it' completes the task just mentioned", done == {created}, reply)
+
+    done, reply = complete(agent, "explicit", f"mark task {ids[1]} as done")
+    check("'task N' completes task N", done == {ids[1]}, reply)
+
+    done, reply = complete(agent, "vague", "mark the 3 reports as finished")
+    check("a number that isn't 'task N' or '#N' asks which task", not done, reply)
+
+    done, reply = complete(agent, "vague", "remind me to mark the invoices as done by friday")
+    check("a reminder mentioning 'mark ... as done' completes nothing", not done, reply)
+
+    if failures:
+        sys.exit(f"\n{len(failures)} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Check that a client's reads go to the primary right after it writes, and
+back to the replicas once READ_YOUR_WRITES_SECONDS have passed. The
+"replica" is a second SQLite database that never receives the writes, so a
+read that reaches it can't find the task:
+
+    python benchmarks/check_read_your_writes.py
+
+Exits with status 1 when any check fails.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_primary = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+_replica = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_primary.name}"
+os.environ["DATABASE_REPLICA_URLS"] = f"sqlite:///{_replica.name}"
+os.environ["READ_YOUR_WRITES_SECONDS"] = "1"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+from app.db.session import PRIMARY_PIN_COOKIE, create_tables, replica_pool
+from app.main import app
+from app.models.task import Base
+from app.utils.config import settings
+
+failures = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def main():
+    create_tables()
+    # Same schema on the replica, but none of the rows
+    for replica in replica_pool.engines:
+        Base.metadata.create_all(bind=replica)
+
+    writer = TestClient(app)
+    task_id = writer.post("/api/v1/tasks", json={"title": "read your writes"}).json()["id"]
+    check("a write sets the primary pin cookie", PRIMARY_PIN_COOKIE in writer.cookies)
+
+    status = writer.get(f"/api/v1/tasks/{task_id}").status_code
+    check("a read right after the write goes to the primary", status == 200, str(status))
+
+    status = TestClient(app).get(f"/api/v1/tasks/{task_id}").status_code
+    check("a client that hasn't written reads from the replica", status == 404, str(status))
+
+    time.sleep(settings.READ_YOUR_WRITES_SECONDS + 0.2)
+    status = writer.get(f"/api/v1/tasks/{task_id}").status_code
+    check("reads go back to the replica once the pin expires", status == 404, str(status))
+
+    if failures:
+        sys.exit(f"\n{len(failures)} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Check that semantic search scores unrelated task titles below
+SEMANTIC_MIN_SCORE, so hash collisions don't surface them as matches, and
+related titles above it:
+
+    python benchmarks/check_semantic_scores.py [--dimensions 4096]
+
+Exits with status 1 when any check fails.
+"""
+
+import argparse
+import itertools
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.semantic_search import embed
+from app.utils.config import settings
+
+# No two of these share a word
+UNRELATED = [
+    "Water plants", "frontend refactor", "Pay electricity bill", "Book dentist appointment",
+    "Prepare quarterly report", "Call mom", "Fix login bug", "Buy groceries",
+    "Renew passport", "Update resume", "Plan team offsite", "Review pull request",
+    "Clean the garage", "Schedule car service", "Write blog post", "Order birthday cake",
+    "Migrate database to Postgres", "Walk the dog", "Cancel gym membership", "Backup laptop",
+    "Email landlord about heating", "Practice guitar", "Refill prescription", "Draft project proposal",
+]
+
+RELATED = [
+    ("Water plants", "water the plants on the balcony"),
+    ("frontend refactor", "refactoring the frontend"),
+    ("Pay electricity bill", "electricity bill"),
+    ("Fix login bug", "login page bug"),
+]
+
+failures = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def score(first: str, second: str, dimensions: int) -> float:
+    return float(embed(first, dimensions) @ embed(second, dimensions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dimensions", type=int, default=settings.SEMANTIC_DIMENSIONS)
+    args = parser.parse_args()
+    threshold = settings.SEMANTIC_MIN_SCORE
+
+    scores = sorted(
+        ((score(first, second, args.dimensions), first, second) for first, second in itertools.combinations(UNRELATED, 2)),
+        reverse=True,
+    )
+    worst, first, second = scores[0]
+    check(
+        f"{len(scores)} unrelated pairs score below {threshold} at {args.dimensions} dimensions",
+        worst < threshold,
+        f"highest {worst:.2f}: {first!r} vs {second!r}",
+    )
+
+    for first, second in RELATED:
+        value = score(first, second, args.dimensions)
+        check(f"{first!r} matches {second!r}", value >= threshold, f"{value:.2f}")
+
+    if failures:
+        sys.exit(f"\n{len(failures)} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
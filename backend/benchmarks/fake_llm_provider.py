@@ -0,0 +1,46 @@
+# Test double for the LLM provider, used by the benchmark scripts
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.llm_provider import LLMProvider
+
+
+class FakeProvider(LLMProvider):
+    """
+    Local stand-in for a provider, for exercising the resilient client's
+    deadline, hedging and circuit breaker without network access. Each call
+    sleeps for `latency` seconds and then fails with probability
+    `error_rate`. `latency` may also be a function of the 1-based call
+    number, e.g. to make only the first call slow. Both can be changed
+    between calls.
+    """
+
+    def __init__(
+        self,
+        latency: Union[float, Callable[[int], float]] = 0.0,
+        error_rate: float = 0.0,
+        response: str = "OK",
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.response = response
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            fail = self._random.random() < self.error_rate
+        time.sleep(self.latency(call) if callable(self.latency) else self.latency)
+        if fail:
+            raise RuntimeError(f"Injected provider error on call {call}")
+        return self.response
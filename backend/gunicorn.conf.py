@@ -0,0 +1,40 @@
+"""
+Gunicorn configuration for running the API in production:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+All values come from Settings (environment variables / .env).
+"""
+from app.utils.config import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WEB_CONCURRENCY
+worker_class = "app.workers.ProductionUvicornWorker"
+
+# Import the app once in the master so workers fork with it already loaded
+preload_app = True
+
+# Recycle workers periodically; jitter keeps them from restarting together
+max_requests = settings.MAX_REQUESTS
+max_requests_jitter = settings.MAX_REQUESTS_JITTER
+
+graceful_timeout = settings.GRACEFUL_TIMEOUT
+keepalive = settings.KEEPALIVE
+timeout = settings.WORKER_TIMEOUT
+
+accesslog = "-"
+errorlog = "-"
+
+def on_starting(server):
+    # Create tables once here rather than in every worker: workers racing
+    # through create_all on a fresh database fail to boot, and a worker boot
+    # error stops the whole server
+    from app.db.session import create_tables, engine
+    create_tables()
+    engine.dispose()
+
+def post_fork(server, worker):
+    # Connection pools must not be shared across processes; drop any
+    # connections inherited from the master without closing them
+    from app.db.session import engine
+    engine.dispose(close=False)
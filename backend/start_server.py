@@ -12,20 +12,17 @@ from pathlib import Path
 backend_dir = Path(__file__).parent
 sys.path.insert(0, str(backend_dir))
 
-# Now we can import and run the app
+# Now we can run the app
 if __name__ == "__main__":
     import uvicorn
-    from app.main import app
+    from app.utils.config import settings
     
-    # Load environment variables
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    # Start the server
+    # Start the server; uvicorn imports app.main itself from the string path,
+    # so it is not imported (and paid for) twice here
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=settings.DEBUG,
         log_level="info"
     )
\ No newline at end of file
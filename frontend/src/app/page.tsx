@@ -7,10 +7,15 @@ import { ChatInterface } from '@/components/chat/ChatInterface';
 import { ThemeToggle } from '@/components/ui/ThemeToggle';
 import { useDarkMode } from '@/hooks/useDarkMode';
 import { useWebSocket } from '@/hooks/useWebSocket';
-import { apiClient } from '@/utils/api';
+import { apiClient, TENANT_ID } from '@/utils/api';
 import { v4 as uuidv4 } from 'uuid';
 
-const WEBSOCKET_URL = process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000/api/v1/ws';
+const WEBSOCKET_BASE_URL = process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000/api/v1/ws';
+const WEBSOCKET_URL = TENANT_ID
+  ? `${WEBSOCKET_BASE_URL}?tenant=${encodeURIComponent(TENANT_ID)}`
+  : WEBSOCKET_BASE_URL;
+// "msgpack" for compact binary frames, e.g. for clients on slow mobile links
+const WEBSOCKET_FORMAT = process.env.NEXT_PUBLIC_WS_FORMAT === 'msgpack' ? 'msgpack' : 'json';
 
 export default function Home() {
   const [tasks, setTasks] = useState<Task[]>([]);
@@ -82,6 +87,20 @@ export default function Home() {
     // (handleTaskCreate, handleTaskUpdate, handleTaskDelete)
   }, []);
 
+  const loadTasks = useCallback(async () => {
+    try {
+      setIsLoading(true);
+      const initialTasks = await apiClient.getTasks();
+      console.log('Initial tasks loaded:', initialTasks.length);
+      setTasks(initialTasks);
+    } catch (err) {
+      setError('Failed to load tasks');
+      console.error('Error loading tasks:', err);
+    } finally {
+      setIsLoading(false);
+    }
+  }, []);
+
   // Initialize WebSocket connection
   const { 
     isConnected, 
@@ -94,27 +113,15 @@ export default function Home() {
     onTaskCreate: handleTaskCreate,
     onTaskDelete: handleTaskDelete,
     onChatResponse: handleChatResponse,
+    onResync: loadTasks,
+    format: WEBSOCKET_FORMAT,
   });
 
   // Load initial tasks
   useEffect(() => {
-    const loadTasks = async () => {
-      try {
-        setIsLoading(true);
-        const initialTasks = await apiClient.getTasks();
-        console.log('Initial tasks loaded:', initialTasks.length);
-        setTasks(initialTasks);
-      } catch (err) {
-        setError('Failed to load tasks');
-        console.error('Error loading tasks:', err);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
     loadTasks();
-  }, []);
-  
+  }, [loadTasks]);
+
   // Debug effect to monitor task state
   useEffect(() => {
     const duplicates = tasks.filter((task, index, arr) => 
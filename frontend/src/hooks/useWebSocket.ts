@@ -2,6 +2,13 @@
 
 import { useEffect, useRef, useState, useCallback } from 'react';
 import { WebSocketMessage, Task, ChatMessage } from '@/types';
+import { apiClient } from '@/utils/api';
+import { WireFormat, decodeFrame, encodeFrame, subprotocolsFor } from '@/utils/wsProtocol';
+
+// How many applied seqs to remember; must exceed REPLAY_LOOKBACK
+const MAX_SEEN_SEQS = 5000;
+// Seqs below the last one applied to replay after a reconnect
+const REPLAY_LOOKBACK = 1000;
 
 interface UseWebSocketProps {
   url: string;
@@ -10,6 +17,10 @@ interface UseWebSocketProps {
   onTaskCreate?: (task: Task) => void;
   onTaskDelete?: (taskId: number) => void;
   onChatResponse?: (message: ChatMessage) => void;
+  // Called when missed events can no longer be replayed and tasks should be reloaded
+  onResync?: () => void;
+  // Wire format to ask the server for; MessagePack frames are smaller and faster to parse
+  format?: WireFormat;
 }
 
 export const useWebSocket = ({
@@ -19,90 +30,230 @@ export const useWebSocket = ({
   onTaskCreate,
   onTaskDelete,
   onChatResponse,
+  onResync,
+  format = 'json',
 }: UseWebSocketProps) => {
   const [isConnected, setIsConnected] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const ws = useRef<WebSocket | null>(null);
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
+  // Highest task event seq applied, where replays resume from
+  const lastSeq = useRef(0);
+  // Recently applied seqs. Events are delivered at least once, and a
+  // transaction can commit after later seqs were delivered, so duplicates
+  // are recognised by seq rather than by being at or below lastSeq
+  const seenSeqs = useRef<Set<number>>(new Set());
+  const replaying = useRef(false);
+  const queued = useRef<WebSocketMessage[]>([]);
+  const hasConnected = useRef(false);
+
+  const sendMessage = useCallback((message: any) => {
+    if (ws.current && ws.current.readyState === WebSocket.OPEN) {
+      ws.current.send(encodeFrame(message, ws.current.protocol));
+    } else {
+      console.error('WebSocket is not connected');
+    }
+  }, []);
+
+  const dispatch = useCallback((message: WebSocketMessage) => {
+    if (message.seq !== undefined) {
+      const seen = seenSeqs.current;
+      if (seen.has(message.seq)) {
+        return;
+      }
+      seen.add(message.seq);
+      if (seen.size > MAX_SEEN_SEQS) {
+        // Sets iterate in insertion order, so this forgets the oldest
+        seen.delete(seen.values().next().value as number);
+      }
+      lastSeq.current = Math.max(lastSeq.current, message.seq);
+    }
+
+    // Handle different message types
+    switch (message.type) {
+      case 'chat_response':
+        if (onChatResponse) {
+          onChatResponse({
+            id: Date.now().toString(),
+            message: '',
+            response: message.response || '',
+            timestamp: message.timestamp || new Date().toISOString(),
+            isUser: false,
+            tasksUpdated: message.tasks_updated,
+          });
+        }
+        break;
+
+      case 'task_created':
+        if (onTaskCreate && message.task) {
+          onTaskCreate(message.task);
+        }
+        break;
+
+      case 'task_updated':
+        if (onTaskUpdate && message.task) {
+          onTaskUpdate(message.task);
+        }
+        break;
+
+      case 'task_deleted':
+        if (onTaskDelete && message.task_id) {
+          onTaskDelete(message.task_id);
+        }
+        break;
+
+      case 'tasks_archived':
+        // Archived tasks leave the active list
+        if (onTaskDelete && message.task_ids) {
+          message.task_ids.forEach(onTaskDelete);
+        }
+        break;
+
+      case 'tasks_imported':
+        if (onResync) {
+          onResync();
+        }
+        break;
+
+      case 'error':
+        // Server rejected the request (e.g. rate limited); surface it in the chat
+        if (onChatResponse && message.message) {
+          onChatResponse({
+            id: Date.now().toString(),
+            message: '',
+            response: message.message,
+            timestamp: message.timestamp || new Date().toISOString(),
+            isUser: false,
+          });
+        }
+        break;
+
+      case 'tasks_updated':
+        // Handle bulk task updates
+        if (message.data) {
+          console.log('Tasks updated:', message.data);
+        }
+        break;
+
+      case 'ping':
+        // Server heartbeat; connections that stop answering are closed
+        sendMessage({ type: 'pong' });
+        break;
+
+      case 'pong':
+        break;
+
+      default:
+        console.log('Unknown message type:', message.type);
+    }
+
+    // Call the general onMessage handler
+    if (onMessage) {
+      onMessage(message);
+    }
+  }, [sendMessage, onMessage, onTaskUpdate, onTaskCreate, onTaskDelete, onChatResponse, onResync]);
+
+  const receive = useCallback((message: WebSocketMessage) => {
+    // Several events committed together arrive as one batch message
+    if (message.type === 'batch') {
+      (message.events || []).forEach(dispatch);
+    } else {
+      dispatch(message);
+    }
+  }, [dispatch]);
+
+  // Replay the task events missed while disconnected, then apply the live
+  // events that arrived in the meantime
+  const catchUp = useCallback(async () => {
+    replaying.current = true;
+    try {
+      // The first page also looks back below the cursor for events that
+      // committed late; the seen seqs filter out the rest
+      let after = lastSeq.current;
+      let lookback = REPLAY_LOOKBACK;
+      let more = true;
+      while (more) {
+        const replay = await apiClient.getEvents(after, lookback);
+        if (replay.truncated) {
+          // Some missed events were already pruned; start over from a full reload
+          if (onResync) {
+            onResync();
+          }
+          break;
+        }
+        replay.events.forEach(dispatch);
+        more = replay.has_more && replay.events.length > 0;
+        if (more) {
+          after = replay.events[replay.events.length - 1].seq as number;
+          lookback = 0;
+        }
+      }
+    } catch (err) {
+      console.error('Error replaying missed task events:', err);
+      if (onResync) {
+        onResync();
+      }
+    } finally {
+      replaying.current = false;
+      const pending = queued.current;
+      queued.current = [];
+      pending.forEach(receive);
+    }
+  }, [dispatch, receive, onResync]);
 
   const connect = useCallback(() => {
     // Prevent multiple simultaneous connection attempts
     if (ws.current && ws.current.readyState === WebSocket.CONNECTING) {
       return;
     }
-    
+
     try {
-      ws.current = new WebSocket(url);
+      ws.current = new WebSocket(url, subprotocolsFor(format));
+      ws.current.binaryType = 'arraybuffer';
 
       ws.current.onopen = () => {
         setIsConnected(true);
         setError(null);
         reconnectAttempts.current = 0;
         console.log('WebSocket connected');
+        if (lastSeq.current > 0) {
+          catchUp();
+        } else if (hasConnected.current && onResync) {
+          // Reconnected before any task event arrived; nothing to resume from
+          onResync();
+        }
+        hasConnected.current = true;
       };
 
       ws.current.onmessage = (event) => {
+        let message: WebSocketMessage;
         try {
-          const message: WebSocketMessage = JSON.parse(event.data);
-          
-          // Handle different message types
-          switch (message.type) {
-            case 'chat_response':
-              if (onChatResponse) {
-                onChatResponse({
-                  id: Date.now().toString(),
-                  message: '',
-                  response: message.response || '',
-                  timestamp: message.timestamp || new Date().toISOString(),
-                  isUser: false,
-                  tasksUpdated: message.tasks_updated,
-                });
-              }
-              break;
-            
-            case 'task_created':
-              if (onTaskCreate && message.task) {
-                onTaskCreate(message.task);
-              }
-              break;
-            
-            case 'task_updated':
-              if (onTaskUpdate && message.task) {
-                onTaskUpdate(message.task);
-              }
-              break;
-            
-            case 'task_deleted':
-              if (onTaskDelete && message.task_id) {
-                onTaskDelete(message.task_id);
-              }
-              break;
-            
-            case 'tasks_updated':
-              // Handle bulk task updates
-              if (message.data) {
-                console.log('Tasks updated:', message.data);
-              }
-              break;
-            
-            default:
-              console.log('Unknown message type:', message.type);
-          }
-
-          // Call the general onMessage handler
-          if (onMessage) {
-            onMessage(message);
-          }
+          message = decodeFrame(event.data, (event.target as WebSocket).protocol);
         } catch (err) {
           console.error('Error parsing WebSocket message:', err);
+          return;
         }
+        // Hold task events back while missed ones are being replayed, so they
+        // are applied in order
+        if (replaying.current && (message.seq !== undefined || message.type === 'batch')) {
+          queued.current.push(message);
+          return;
+        }
+        receive(message);
       };
 
-      ws.current.onclose = () => {
+      ws.current.onclose = (event) => {
         setIsConnected(false);
         console.log('WebSocket disconnected');
-        
+
+        // 1012 = server worker restarting; reconnect promptly to another worker
+        // without using up the retry budget (jitter spreads the reconnects)
+        if (event.code === 1012 && reconnectAttempts.current < maxReconnectAttempts) {
+          setTimeout(connect, 250 + Math.random() * 1000);
+          return;
+        }
+
         // Only attempt to reconnect if it wasn't a manual disconnect
         if (reconnectAttempts.current < maxReconnectAttempts) {
           reconnectAttempts.current++;
@@ -118,7 +269,7 @@ export const useWebSocket = ({
 
       ws.current.onerror = (event) => {
         console.log('WebSocket error event:', event);
-        
+
         // Only set meaningful error messages
         if (event.type === 'error') {
           if (ws.current?.readyState === WebSocket.CLOSED) {
@@ -137,7 +288,7 @@ export const useWebSocket = ({
       setError('Failed to create WebSocket connection');
       console.error('WebSocket connection error:', err);
     }
-  }, [url, onMessage, onTaskUpdate, onTaskCreate, onTaskDelete, onChatResponse]);
+  }, [url, format, receive, catchUp, onResync]);
 
   const disconnect = useCallback(() => {
     if (ws.current) {
@@ -146,14 +297,6 @@ export const useWebSocket = ({
     }
   }, []);
 
-  const sendMessage = useCallback((message: any) => {
-    if (ws.current && ws.current.readyState === WebSocket.OPEN) {
-      ws.current.send(JSON.stringify(message));
-    } else {
-      console.error('WebSocket is not connected');
-    }
-  }, []);
-
   const sendChatMessage = useCallback((message: string) => {
     sendMessage({
       type: 'chat',
@@ -194,4 +337,4 @@ export const useWebSocket = ({
     disconnect,
     reconnect: connect,
   };
-};
\ No newline at end of file
+};
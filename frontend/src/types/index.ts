@@ -8,6 +8,9 @@ export interface Task {
   created_at: string;
   updated_at?: string;
   due_date?: string;
+  recurrence?: string | null;
+  recurrence_id?: number | null;
+  occurrence_date?: string | null;
 }
 
 export interface ChatMessage {
@@ -37,4 +40,19 @@ export interface WebSocketMessage {
   task_id?: number;
   tasks?: Task[];
   timestamp?: string;
+  error?: string;
+  retry_after?: number;
+  // Outbox sequence number of task events
+  seq?: number;
+  // Events of a "batch" message
+  events?: WebSocketMessage[];
+  // Tasks moved by a "tasks_archived" event
+  task_ids?: number[];
+  count?: number;
+}
+
+export interface EventReplay {
+  events: WebSocketMessage[];
+  truncated: boolean;
+  has_more: boolean;
 }
\ No newline at end of file
@@ -1,6 +1,8 @@
-import { Task, TaskFilter, ChatMessage } from '@/types';
+import { Task, TaskFilter, ChatMessage, EventReplay } from '@/types';
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api/v1';
+// Optional tenant (team) whose tasks this client works with
+export const TENANT_ID = process.env.NEXT_PUBLIC_TENANT_ID || '';
 
 export class ApiClient {
   private baseUrl: string;
@@ -15,8 +17,11 @@ export class ApiClient {
   ): Promise<T> {
     const url = `${this.baseUrl}${endpoint}`;
     const config: RequestInit = {
+      // Send the API's cookies, which keep reads on the primary right after a write
+      credentials: 'include',
       headers: {
         'Content-Type': 'application/json',
+        ...(TENANT_ID ? { 'X-Tenant-ID': TENANT_ID } : {}),
         ...options.headers,
       },
       ...options,
@@ -69,6 +74,11 @@ export class ApiClient {
     return this.request<Task>(`/tasks/${id}`);
   }
 
+  // Task events after the given sequence number, for catching up after a reconnect
+  async getEvents(after: number, lookback: number = 0, limit: number = 500): Promise<EventReplay> {
+    return this.request<EventReplay>(`/events?after=${after}&lookback=${lookback}&limit=${limit}`);
+  }
+
   // Chat API methods
   async sendChatMessage(message: string): Promise<{
     response: string;
@@ -0,0 +1,118 @@
+import { decode, encode } from '@msgpack/msgpack';
+
+// WebSocket wire formats, offered through Sec-WebSocket-Protocol. The server
+// speaks plain JSON to clients that don't negotiate one. Must match
+// backend/app/utils/ws_protocol.py; a version's key table never changes.
+export const JSON_V1 = 'taskmgr.json.v1';
+export const MSGPACK_V1 = 'taskmgr.msgpack.v1';
+export const MSGPACK_V2 = 'taskmgr.msgpack.v2';
+
+export type WireFormat = 'json' | 'msgpack';
+
+// Subprotocols to offer, most preferred first
+export const subprotocolsFor = (format: WireFormat): string[] =>
+  format === 'msgpack' ? [MSGPACK_V2, MSGPACK_V1, JSON_V1] : [JSON_V1];
+
+const COMPACT_KEYS_V1: Record<string, string> = {
+  type: 't',
+  seq: 's',
+  timestamp: 'ts',
+  events: 'ev',
+  message: 'm',
+  response: 'r',
+  error: 'er',
+  retry_after: 'ra',
+  tasks_updated: 'tu',
+  task_data: 'td',
+  data: 'da',
+  task: 'k',
+  tasks: 'ks',
+  task_id: 'ki',
+  task_ids: 'kis',
+  count: 'n',
+  id: 'id',
+  title: 'ti',
+  description: 'de',
+  completed: 'co',
+  priority: 'pr',
+  category: 'cg',
+  created_at: 'ca',
+  updated_at: 'ua',
+  due_date: 'dd',
+  completed_at: 'ct',
+};
+
+// v2 adds the recurring task fields
+const COMPACT_KEYS_V2: Record<string, string> = {
+  ...COMPACT_KEYS_V1,
+  recurrence: 'rr',
+  recurrence_id: 'ri',
+  occurrence_date: 'od',
+};
+
+// Sent as epoch milliseconds in MessagePack frames
+const TIMESTAMP_KEYS_V1 = ['timestamp', 'created_at', 'updated_at', 'due_date', 'completed_at'];
+const TIMESTAMP_KEYS_V2 = [...TIMESTAMP_KEYS_V1, 'occurrence_date'];
+
+interface KeyTable {
+  compact: Record<string, string>;
+  full: Record<string, string>;
+  timestamps: Set<string>;
+}
+
+const keyTable = (compact: Record<string, string>, timestamps: string[]): KeyTable => ({
+  compact,
+  full: Object.fromEntries(Object.entries(compact).map(([full, short]) => [short, full])),
+  timestamps: new Set(timestamps),
+});
+
+const KEY_TABLES: Record<string, KeyTable> = {
+  [MSGPACK_V1]: keyTable(COMPACT_KEYS_V1, TIMESTAMP_KEYS_V1),
+  [MSGPACK_V2]: keyTable(COMPACT_KEYS_V2, TIMESTAMP_KEYS_V2),
+};
+
+// Keep the 'Z': the epoch values are UTC, and a zoneless ISO string would be
+// parsed by Date as local time
+const toIsoString = (ms: number) => new Date(ms).toISOString();
+
+const expand = (value: unknown, table: KeyTable): unknown => {
+  if (Array.isArray(value)) {
+    return value.map((item) => expand(item, table));
+  }
+  if (value !== null && typeof value === 'object') {
+    const expanded: Record<string, unknown> = {};
+    for (const [key, item] of Object.entries(value as Record<string, unknown>)) {
+      const fullKey = table.full[key] ?? key;
+      expanded[fullKey] = table.timestamps.has(fullKey) && typeof item === 'number'
+        ? toIsoString(item)
+        : expand(item, table);
+    }
+    return expanded;
+  }
+  return value;
+};
+
+const compact = (value: unknown, table: KeyTable): unknown => {
+  if (Array.isArray(value)) {
+    return value.map((item) => compact(item, table));
+  }
+  if (value !== null && typeof value === 'object') {
+    const compacted: Record<string, unknown> = {};
+    for (const [key, item] of Object.entries(value as Record<string, unknown>)) {
+      compacted[table.compact[key] ?? key] = compact(item, table);
+    }
+    return compacted;
+  }
+  return value;
+};
+
+// Decode a frame of the accepted subprotocol into a message with the same
+// shape as the JSON protocol
+export const decodeFrame = (data: string | ArrayBuffer, protocol: string): any =>
+  typeof data === 'string'
+    ? JSON.parse(data)
+    : expand(decode(new Uint8Array(data)), KEY_TABLES[protocol] ?? KEY_TABLES[MSGPACK_V2]);
+
+// Encode a message for the subprotocol the server accepted
+export const encodeFrame = (message: unknown, protocol: string): string | Uint8Array =>
+  protocol in KEY_TABLES ? encode(compact(message, KEY_TABLES[protocol])) : JSON.stringify(message);